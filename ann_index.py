@@ -0,0 +1,180 @@
+"""
+Inverted-file (IVF) approximate nearest-neighbour index
+
+Vectors are clustered with spherical k-means; a query only scans the
+rows of its ``nprobe`` closest clusters. ``nprobe`` is the recall/latency
+knob: more probed clusters means higher recall and more rows scanned.
+
+The index is built offline from the NumPy vector store and persisted
+next to it:
+
+    python ann_index.py            # build with rag.ann settings + recall report
+    python ann_index.py --report   # only measure recall@k of an existing index
+"""
+
+import argparse
+import hashlib
+import os
+import time
+from typing import Dict, List
+
+import numpy as np
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def ids_signature(ids: List[str]) -> str:
+    """Hash of the ids in row order; an index is only valid for the rows it was built on"""
+    return hashlib.sha1("\n".join(ids).encode('utf-8')).hexdigest()
+
+
+class IVFIndex:
+    def __init__(self, centroids: np.ndarray, offsets: np.ndarray, rows: np.ndarray, signature: str = None):
+        self.centroids = centroids
+        self.offsets = offsets
+        self.rows = rows
+        # ids_signature of the first n_rows store ids at build time
+        self.signature = signature
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @property
+    def n_rows(self) -> int:
+        """Number of matrix rows covered by the index (later rows are unindexed)"""
+        return len(self.rows)
+
+    @classmethod
+    def build(cls, matrix: np.ndarray, nlist: int = None, n_iter: int = 10,
+              block_size: int = 65536, seed: int = 42) -> "IVFIndex":
+        """Train centroids on a sample of the (normalized) matrix and assign every row"""
+        n = len(matrix)
+        if nlist is None or nlist <= 0:
+            nlist = max(1, int(4 * np.sqrt(n)))
+        nlist = min(nlist, n)
+
+        rng = np.random.default_rng(seed)
+        sample_size = min(n, nlist * 256)
+        sample = _normalize_rows(matrix[np.sort(rng.choice(n, sample_size, replace=False))])
+
+        # Spherical k-means: assign by cosine, recompute unit-length centroids
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+        for _ in range(n_iter):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=nlist)
+
+            # Re-seed clusters that lost all their points
+            empty = np.flatnonzero(counts == 0)
+            sums[empty] = sample[rng.choice(sample_size, len(empty), replace=False)]
+            centroids = _normalize_rows(sums)
+
+        labels = np.empty(n, dtype=np.int32)
+        for start in range(0, n, block_size):
+            block = np.asarray(matrix[start:start + block_size], dtype=np.float32)
+            labels[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+
+        # CSR layout: rows of cluster c are rows[offsets[c]:offsets[c + 1]]
+        rows = np.argsort(labels, kind='stable').astype(np.int32)
+        offsets = np.searchsorted(labels[rows], np.arange(nlist + 1)).astype(np.int64)
+        return cls(centroids.astype(np.float32), offsets, rows)
+
+    def probe(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        """Sorted matrix rows of the nprobe clusters closest to the query"""
+        nprobe = min(nprobe, self.nlist)
+        centroid_scores = self.centroids @ query
+        clusters = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        rows = np.concatenate([self.rows[self.offsets[c]:self.offsets[c + 1]] for c in clusters])
+        return np.sort(rows)
+
+    def save(self, path: str):
+        np.savez(path, centroids=self.centroids, offsets=self.offsets, rows=self.rows,
+                 signature=np.asarray(self.signature or ''))
+
+    @classmethod
+    def load(cls, path: str) -> "IVFIndex":
+        data = np.load(path)
+        signature = str(data['signature']) if 'signature' in data.files else None
+        return cls(data['centroids'], data['offsets'], data['rows'], signature or None)
+
+
+def measure_recall(store, queries: np.ndarray, k: int = 10,
+                   nprobe_values=(1, 2, 4, 8, 16, 32)) -> List[Dict]:
+    """
+    Recall@k and mean latency of the IVF store against its own exact scan.
+
+    ``store`` is an IVFVectorStore; exact results come from the
+    underlying NumPy scan with the index disabled.
+    """
+    ivf, original_nprobe = store.ivf, store.nprobe
+
+    store.ivf = None
+    start = time.perf_counter()
+    exact = [store.query(query[np.newaxis, :], k)['ids'][0] for query in queries]
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    store.ivf = ivf
+
+    report = [{'nprobe': 'exact', 'recall': 1.0, 'latency_ms': exact_ms}]
+    for nprobe in nprobe_values:
+        store.nprobe = nprobe
+        start = time.perf_counter()
+        approx = [store.query(query[np.newaxis, :], k)['ids'][0] for query in queries]
+        latency_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        recall = np.mean([len(set(a) & set(e)) / max(1, len(e)) for a, e in zip(approx, exact)])
+        report.append({'nprobe': nprobe, 'recall': float(recall), 'latency_ms': latency_ms})
+
+    store.nprobe = original_nprobe
+    return report
+
+
+def main():
+    import yaml
+    from vector_store import IVFVectorStore
+
+    parser = argparse.ArgumentParser(description="Build the IVF index and report recall@k")
+    parser.add_argument('--config', default='config.yaml')
+    parser.add_argument('--report', action='store_true', help="skip the build, only measure")
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    args = parser.parse_args()
+
+    with open(args.config, 'r') as f:
+        rag_config = yaml.safe_load(f)['rag']
+    ann_config = rag_config.get('ann', {})
+
+    store = IVFVectorStore(
+        path=rag_config.get('numpy_index_path', './numpy_index'),
+        storage=rag_config.get('vector_storage', 'float32'),
+        rescore_candidates=rag_config.get('rescore_candidates', 0),
+        nprobe=ann_config.get('nprobe', 8)
+    )
+    if store.count() == 0:
+        print("NumPy vector index is empty; start the app once to populate it")
+        return
+
+    if not args.report:
+        start = time.perf_counter()
+        store.build_ivf(nlist=ann_config.get('nlist', 0), n_iter=ann_config.get('train_iterations', 10))
+        print(f"Built IVF index with {store.ivf.nlist} lists in {time.perf_counter() - start:.1f}s")
+
+    # Perturbed stored vectors stand in for real queries
+    rng = np.random.default_rng(0)
+    rows = rng.choice(store.count(), min(args.queries, store.count()), replace=False)
+    queries = np.asarray(store.matrix[np.sort(rows)], dtype=np.float32)
+    queries += rng.normal(0, 0.05, queries.shape).astype(np.float32)
+
+    print(f"\nrecall@{args.k} vs exact search ({store.count()} vectors, {len(queries)} queries)")
+    print(f"{'nprobe':>8} {'recall':>8} {'ms/query':>10}")
+    for row in measure_recall(store, queries, k=args.k):
+        print(f"{row['nprobe']:>8} {row['recall']:>8.3f} {row['latency_ms']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
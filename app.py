@@ -36,6 +36,7 @@ from llm_engine import FoundationLLMEngine, QueryType
 from nlp_pipeline import AdvancedNLPPipeline
 from concept_visualizer import ConceptVisualizer
 from rag_system import RAGSystem
+from keyword_index import reciprocal_rank_fusion
 
 
 class CSExpertApp:
@@ -173,11 +174,13 @@ class CSExpertApp:
                 status_text.text("📚 Loading research papers...")
                 progress_bar.progress(30)
                 processor.fetch_arxiv_papers()
+                processor.load_keyword_index()
                 
                 # Step 3: Create semantic embeddings
                 status_text.text("🧠 Creating semantic embeddings...")
                 progress_bar.progress(50)
                 processor.create_enhanced_embeddings()
+                processor.load_knn_graph()
                 
                 # Step 4: Initialize NLP pipeline
                 status_text.text("🔤 Setting up NLP pipeline...")
@@ -213,13 +216,23 @@ class CSExpertApp:
     
     def _setup_rag_system(self, llm_engine, processor):
         """Setup RAG system with vector database"""
+        llm_engine.rag_system.knn_graph = processor.knn_graph
+        
         try:
             if llm_engine.rag_system.collection:
-                count = llm_engine.rag_system.collection.count()
-                if count == 0:
-                    llm_engine.rag_system.add_papers_to_vector_db(
-                        processor.papers, processor.embeddings
-                    )
+                # Only new or changed papers are embedded into the index;
+                # full records are read for those rows alone
+                model_name = llm_engine.rag_system.config['nlp']['embedding_model']
+                llm_engine.rag_system.sync_papers(
+                    processor.paper_hashes(model_name), processor.embeddings,
+                    fetch_rows=processor.paper_rows
+                )
+            
+            # The text indexes only read ids, titles and abstracts
+            text_papers = processor.paper_columns(('id', 'title', 'abstract'))
+            # Both are rebuilt only when the paper set or its text changed
+            llm_engine.rag_system.build_passage_index(text_papers)
+            llm_engine.rag_system.build_multi_field_index(text_papers)
         except Exception as e:
             st.warning(f"⚠️ RAG system setup warning: {str(e)}")
             # Attempt to add papers anyway
@@ -237,13 +250,13 @@ class CSExpertApp:
             
             # Data status
             st.subheader("📊 Dataset")
-            if self.processor and self.processor.papers:
-                st.success(f"✅ {len(self.processor.papers)} papers loaded")
-                categories = len(set(p['primary_category'] for p in self.processor.papers))
+            if self.processor and self.processor.paper_count:
+                df = self.processor.get_papers_dataframe()
+                st.success(f"✅ {len(df)} papers loaded")
+                categories = len(df['primary_category'].cat.categories)
                 st.info(f"📂 {categories} categories")
                 
                 # Show data range
-                df = self.processor.get_papers_dataframe()
                 date_range = f"{df['year'].min()} - {df['year'].max()}"
                 st.info(f"📅 {date_range}")
             else:
@@ -470,7 +483,7 @@ class CSExpertApp:
             st.progress(similarity, text=f"Relevance: {similarity:.1%}")
             
             # Action buttons
-            col1, col2 = st.columns(2)
+            col1, col2, col3 = st.columns(3)
             with col1:
                 if st.button(f"🔍 Deep Analysis", key=f"analysis_{index}_{len(st.session_state.messages)}"):
                     self._perform_paper_analysis(paper, abstract)
@@ -480,8 +493,30 @@ class CSExpertApp:
                 if pdf_url:
                     st.link_button("📄 View PDF", pdf_url)
             
+            with col3:
+                show_similar = paper.get('id') and st.button(
+                    "🧭 More like this", key=f"similar_{index}_{len(st.session_state.messages)}"
+                )
+            
+            if show_similar:
+                self._display_similar_papers(paper)
+            
             st.markdown('</div>', unsafe_allow_html=True)
     
+    def _display_similar_papers(self, paper: Dict, k: int = 5):
+        """List the precomputed nearest neighbours of a paper"""
+        similar = self.llm_engine.rag_system.similar_papers(paper['id'], k)
+        if not similar:
+            st.info("No related papers found for this paper.")
+            return
+        
+        st.markdown("**Related papers:**")
+        for related in similar:
+            line = f"- {related['title']} ({related.get('published', '')[:4]}) • {related['similarity']:.0%} similar"
+            if related.get('pdf_url'):
+                line += f" • [PDF]({related['pdf_url']})"
+            st.markdown(line)
+    
     def _perform_paper_analysis(self, paper: Dict, abstract: str):
         """Perform deep analysis of a paper"""
         with st.spinner("Performing advanced analysis..."):
@@ -565,20 +600,11 @@ class CSExpertApp:
                     search_query, top_k=50
                 )
 
-                # Also do simple keyword search as fallback
+                # BM25 keyword search over the inverted index
                 keyword_results = self._simple_keyword_search(search_query)
 
-                # Combine results
-                all_results = results + keyword_results
-
-                # Remove duplicates based on title
-                seen_titles = set()
-                unique_results = []
-                for result in all_results:
-                    title = result.get('title', '').lower()
-                    if title not in seen_titles:
-                        seen_titles.add(title)
-                        unique_results.append(result)
+                # Fuse both rankings by reciprocal rank
+                unique_results = reciprocal_rank_fusion([results, keyword_results])
 
                 # Display results
                 st.markdown(f"### 📊 Found {len(unique_results)} relevant papers")
@@ -593,42 +619,35 @@ class CSExpertApp:
                 import traceback
                 st.code(traceback.format_exc())
 
-    def _simple_keyword_search(self, search_query: str):
-        """Simple keyword-based search through papers"""
+    def _simple_keyword_search(self, search_query: str, top_k: int = 10):
+        """BM25 keyword search using the processor's inverted index"""
         results = []
-        search_terms = search_query.lower().split()
 
         try:
-            for paper in self.processor.papers:
-                # Search in title and abstract
-                title = paper.get('title', '').lower()
-                abstract = paper.get('abstract', '').lower()
-                text_to_search = f"{title} {abstract}"
-
-                # Count matching terms
-                matches = sum(1 for term in search_terms if term in text_to_search)
+            keyword_index = self.processor.keyword_index or self.processor.load_keyword_index()
+            hits = keyword_index.search(search_query, top_k=top_k)
+            if not hits:
+                return []
 
-                if matches > 0:
-                    # Calculate simple similarity based on term matches
-                    similarity = matches / len(search_terms)
+            best_score = hits[0][1]
+            papers = self.processor.paper_rows([row for row, _ in hits])
+            for paper, (_, score) in zip(papers, hits):
+                result = {
+                    'id': paper.get('id', ''),
+                    'title': paper.get('title', ''),
+                    'authors': paper.get('authors', []),
+                    'abstract': paper.get('abstract', ''),
+                    'categories': paper.get('categories', []),
+                    'published': paper.get('published', ''),
+                    'primary_category': paper.get('primary_category', ''),
+                    'similarity': score / best_score,
+                    'bm25_score': score,
+                    'document': f"{paper.get('title', '')} {paper.get('abstract', '')}",
+                    'pdf_url': paper.get('pdf_url', '')
+                }
+                results.append(result)
 
-                    result = {
-                        'id': paper.get('id', ''),
-                        'title': paper.get('title', ''),
-                        'authors': paper.get('authors', []),
-                        'abstract': paper.get('abstract', ''),
-                        'categories': paper.get('categories', []),
-                        'published': paper.get('published', ''),
-                        'primary_category': paper.get('primary_category', ''),
-                        'similarity': similarity,
-                        'document': f"{paper.get('title', '')} {paper.get('abstract', '')}",
-                        'pdf_url': paper.get('pdf_url', '')
-                    }
-                    results.append(result)
-
-            # Sort by similarity
-            results.sort(key=lambda x: x['similarity'], reverse=True)
-            return results[:10]  # Return top 10 keyword matches
+            return results
 
         except Exception as e:
             print(f"Keyword search error: {e}")
@@ -704,7 +723,7 @@ class CSExpertApp:
             
             with col2:
                 category_options = list(set(
-                    p['primary_category'] for p in self.processor.papers
+                    p['primary_category'] for p in self.processor.paper_columns(('primary_category',))
                 ))
                 category_filter = st.multiselect("Categories", category_options)
             
@@ -729,18 +748,17 @@ class CSExpertApp:
                     st.error("❌ Vector database not available. Please check ChromaDB setup.")
                     return
 
-                # Perform search
+                # Perform search with year/category filters applied inside the index
                 results = self.llm_engine.rag_system.retrieve_relevant_papers(
-                    search_query, top_k=20
+                    search_query, top_k=20,
+                    filters={'year_range': year_filter, 'categories': category_filter}
                 )
 
                 # Debug information
-                st.info(f"🔍 Raw search returned {len(results)} results")
+                st.info(f"🔍 Filtered search returned {len(results)} results")
 
-                # Apply filters
-                filtered_results = self._apply_search_filters(
-                    results, year_filter, category_filter, min_similarity
-                )
+                # Apply relevance threshold
+                filtered_results = self._apply_search_filters(results, min_similarity)
 
                 # Display results
                 st.markdown(f"### 📊 Found {len(filtered_results)} relevant papers")
@@ -753,31 +771,12 @@ class CSExpertApp:
                 import traceback
                 st.code(traceback.format_exc())
     
-    def _apply_search_filters(self, results: List[Dict], year_filter: Tuple[int, int], 
-                            category_filter: List[str], min_similarity: float) -> List[Dict]:
-        """Apply filters to search results"""
-        filtered_results = []
-        
-        for result in results:
-            # Year filter
-            try:
-                pub_year = int(result.get('published', '2020')[:4])
-                if not (year_filter[0] <= pub_year <= year_filter[1]):
-                    continue
-            except (ValueError, TypeError):
-                continue
-            
-            # Category filter
-            if category_filter and result.get('primary_category') not in category_filter:
-                continue
-            
-            # Similarity filter
-            if result.get('similarity', 0) < min_similarity:
-                continue
-            
-            filtered_results.append(result)
-        
-        return filtered_results
+    def _apply_search_filters(self, results: List[Dict], min_similarity: float) -> List[Dict]:
+        """Drop results below the relevance threshold (year/category are filtered in the index)"""
+        return [
+            result for result in results
+            if result.get('similarity', 0) >= min_similarity
+        ]
     
     def _display_search_results(self, results: List[Dict]):
         """Display search results with enhanced information"""
@@ -1062,11 +1061,11 @@ class CSExpertApp:
     def _display_dataset_statistics(self):
         """Display dataset statistics"""
         st.markdown("**📊 Dataset Statistics:**")
-        if self.processor and self.processor.papers:
+        if self.processor and self.processor.paper_count:
             df = self.processor.get_papers_dataframe()
             dataset_stats = {
-                "total_papers": len(self.processor.papers),
-                "categories": len(set(p['primary_category'] for p in self.processor.papers)),
+                "total_papers": len(df),
+                "categories": len(df['primary_category'].cat.categories),
                 "average_abstract_length": df['abstract_length'].mean(),
                 "date_range": f"{df['year'].min()} - {df['year'].max()}"
             }
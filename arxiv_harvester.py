@@ -0,0 +1,225 @@
+"""
+Resumable, paginated arXiv harvester
+
+Each category is paged independently (cat:<category>, newest first) by
+advancing its offset, and categories are visited round-robin, one page at
+a time, until max_results unique papers are collected.
+
+Progress survives interruption:
+
+- new papers are appended to ``<checkpoint>.papers.jsonl`` as soon as
+  their page arrives;
+- per-category offsets are written atomically to ``<checkpoint>`` after
+  each page.
+
+On restart the harvester reloads both and continues where it stopped.
+Papers are deduplicated by arXiv id, so a page fetched twice (a crash
+between the two writes, or new submissions shifting the offsets) only
+costs a request.
+
+``harvest()`` returns every paper as one list. ``iter_papers()`` streams
+them instead (checkpointed papers first, then each new page); with
+``keep_papers=False`` only the seen ids are held in memory.
+
+The feed is injectable. ``ArxivFeed`` talks to the arXiv API, and
+``LocalFeed`` serves a list of paper dicts for offline runs and tests.
+"""
+
+import json
+import os
+import random
+import time
+from itertools import islice
+from typing import Callable, Dict, Iterator, List, Optional
+
+
+def paper_from_result(result) -> Dict:
+    """Convert an arxiv.Result into the paper dict used across the app"""
+    return {
+        'id': result.entry_id.split('/')[-1],
+        'title': result.title,
+        'authors': [author.name for author in result.authors],
+        'abstract': result.summary,
+        'categories': result.categories,
+        'published': result.published.isoformat(),
+        'pdf_url': result.pdf_url,
+        'primary_category': result.primary_category,
+        'updated': result.updated.isoformat()
+    }
+
+
+class ArxivFeed:
+    """Pages of one category from the arXiv API, newest submissions first"""
+
+    def __init__(self, page_size: int = 100, delay_seconds: float = 3.0, num_retries: int = 3):
+        import arxiv
+
+        self.arxiv = arxiv
+        self.client = arxiv.Client(page_size=page_size, delay_seconds=delay_seconds, num_retries=num_retries)
+
+    def __call__(self, category: str, offset: int, page_size: int) -> List[Dict]:
+        search = self.arxiv.Search(
+            query=f"cat:{category}",
+            max_results=offset + page_size,
+            sort_by=self.arxiv.SortCriterion.SubmittedDate,
+            sort_order=self.arxiv.SortOrder.Descending
+        )
+        results = self.client.results(search, offset=offset)
+        return [paper_from_result(result) for result in islice(results, page_size)]
+
+
+class LocalFeed:
+    """Stand-in feed over in-memory papers, paged like the API"""
+
+    def __init__(self, papers: List[Dict]):
+        self.papers = sorted(papers, key=lambda paper: paper['published'], reverse=True)
+        self.requests = 0
+
+    def __call__(self, category: str, offset: int, page_size: int) -> List[Dict]:
+        self.requests += 1
+        matching = [paper for paper in self.papers if category in paper['categories']]
+        return matching[offset:offset + page_size]
+
+
+class ArxivHarvester:
+    def __init__(self, feed: Callable, categories: List[str], checkpoint_path: str,
+                 max_results: int = 1000, page_size: int = 100,
+                 max_failures: int = 3, pause: Optional[Callable] = None,
+                 keep_papers: bool = True):
+        self.feed = feed
+        self.categories = list(categories)
+        self.checkpoint_path = checkpoint_path
+        self.papers_path = checkpoint_path + ".papers.jsonl"
+        self.max_results = max_results
+        self.page_size = page_size
+        self.max_failures = max_failures
+
+        # Called between requests; rate limiting for the real API
+        self.pause = pause or (lambda: time.sleep(random.uniform(1, 2)))
+
+        self.keep_papers = keep_papers
+        self.papers = []
+        self.seen = set()
+        self.total = 0
+        self.state = {category: {'offset': 0, 'done': False} for category in self.categories}
+
+        self._load_checkpoint()
+
+    def _load_checkpoint(self):
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, 'r') as f:
+                saved = json.load(f)['categories']
+            for category in self.categories:
+                if category in saved:
+                    self.state[category] = saved[category]
+
+        for paper in self._read_papers_file():
+            self.seen.add(paper['id'])
+            self.total += 1
+            if self.keep_papers:
+                self.papers.append(paper)
+
+        if self.total:
+            print(f"Resuming harvest: {self.total} papers already fetched")
+
+    def _read_papers_file(self) -> Iterator[Dict]:
+        """Checkpointed papers, first occurrence of each id"""
+        if not os.path.exists(self.papers_path):
+            return
+
+        seen = set()
+        with open(self.papers_path, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    paper = json.loads(line)
+                except json.JSONDecodeError:
+                    # Torn last line from an interrupted write
+                    continue
+                if paper['id'] not in seen:
+                    seen.add(paper['id'])
+                    yield paper
+
+    def _save_checkpoint(self):
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'categories': self.state, 'total_papers': self.total}, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _append_papers(self, papers: List[Dict]):
+        with open(self.papers_path, 'a') as f:
+            for paper in papers:
+                f.write(json.dumps(paper) + "\n")
+
+    @property
+    def finished(self) -> bool:
+        return self.total >= self.max_results or all(
+            state['done'] for state in self.state.values()
+        )
+
+    def harvest_page(self, category: str) -> List[Dict]:
+        """Fetch the next page of a category; returns the papers not seen before"""
+        state = self.state[category]
+        page = self.feed(category, state['offset'], self.page_size)
+
+        new_papers = []
+        for paper in page:
+            if paper['id'] not in self.seen and self.total + len(new_papers) < self.max_results:
+                self.seen.add(paper['id'])
+                new_papers.append(paper)
+
+        # Papers hit disk before the offset that skips past them
+        self._append_papers(new_papers)
+        self.total += len(new_papers)
+        if self.keep_papers:
+            self.papers.extend(new_papers)
+        state['offset'] += len(page)
+        state['done'] = len(page) < self.page_size
+        self._save_checkpoint()
+        return new_papers
+
+    def iter_pages(self) -> Iterator[List[Dict]]:
+        """Page through all categories until max_results papers or the feeds run dry"""
+        failures = 0
+        while not self.finished and failures < self.max_failures:
+            for category in self.categories:
+                if self.finished:
+                    break
+                if self.state[category]['done']:
+                    continue
+
+                try:
+                    new_papers = self.harvest_page(category)
+                    failures = 0
+                    print(f"{category}: +{len(new_papers)} papers (offset {self.state[category]['offset']}), "
+                          f"total: {self.total}")
+                except Exception as e:
+                    failures += 1
+                    print(f"Error fetching {category} (attempt {failures}/{self.max_failures}): {e}")
+                    if failures >= self.max_failures:
+                        break
+                    new_papers = []
+
+                if new_papers:
+                    yield new_papers
+                self.pause()
+
+    def harvest(self) -> List[Dict]:
+        """Every harvested paper as one list (requires keep_papers)"""
+        for _ in self.iter_pages():
+            pass
+        return self.papers
+
+    def iter_papers(self) -> Iterator[Dict]:
+        """Every harvested paper: the checkpointed ones, then new pages as they arrive"""
+        yield from self._read_papers_file()
+        for page in self.iter_pages():
+            yield from page
+
+    def cleanup(self):
+        """Remove checkpoint files once the result has been saved elsewhere"""
+        for path in (self.checkpoint_path, self.papers_path):
+            if os.path.exists(path):
+                os.remove(path)
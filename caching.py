@@ -0,0 +1,249 @@
+"""
+Small in-process caches used by the retrieval stack
+"""
+
+import os
+import pickle
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+import numpy as np
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a query string for use as a cache key"""
+    return re.sub(r'\s+', ' ', query).strip().lower()
+
+
+class LRUCache:
+    """Bounded least-recently-used cache with hit/miss counters"""
+
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any):
+        if self.max_size <= 0:
+            return
+
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key: Hashable):
+        return key in self._data
+
+    def get_stats(self) -> Dict:
+        """Get cache usage statistics"""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+
+class SemanticAnswerCache:
+    """
+    Answers keyed by query embedding instead of query text.
+
+    A lookup hits when a cached query of the same query type and
+    namespace (e.g. LLM model and indexed papers) has cosine similarity
+    >= threshold, so paraphrases ("what is ML?" / "explain machine
+    learning") share one answer. Lookups are one product with the stacked
+    query vectors. Entries expire after ttl_seconds; when full, the least
+    recently used entry is evicted. Every insert appends one record to
+    the log at path; loading compacts the log to the fresh entries.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_size: int = 1000,
+                 threshold: float = 0.92, ttl_seconds: float = 86400):
+        self.path = path
+        self.max_size = max_size
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+
+        # Row i of vectors, keys, created and last_used belongs to entries[i]
+        self.vectors = None
+        self.keys = np.zeros(0, dtype=object)
+        self.created = np.zeros(0)
+        self.last_used = np.zeros(0)
+        self.entries = []
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+
+        self._load()
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    @staticmethod
+    def _key(query_type: Optional[str], namespace: str) -> str:
+        return f"{namespace}\0{query_type}"
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+
+        records = []
+        try:
+            with open(self.path, 'rb') as f:
+                while True:
+                    try:
+                        records.append(pickle.load(f))
+                    except EOFError:
+                        break
+        except Exception as e:
+            # A torn last record (interrupted append) ends the log
+            print(f"Error loading answer cache: {e}")
+
+        now = time.time()
+        records = [record for record in records
+                   if isinstance(record, dict) and 'vector' in record and now - record['created'] <= self.ttl_seconds]
+        for record in records[-self.max_size:] if self.max_size > 0 else []:
+            entry = {field: record[field] for field in ('query', 'key', 'answer', 'created')}
+            self._add(record['vector'], entry, record['created'])
+
+        try:
+            self._rewrite()
+        except Exception as e:
+            print(f"Error compacting answer cache: {e}")
+        print(f"Loaded answer cache with {len(self.entries)} entries")
+
+    def _rewrite(self):
+        """Replace the log with one record per current entry"""
+        tmp_path = self.path + ".tmp"
+        with self._file_lock:
+            with open(tmp_path, 'wb') as f:
+                for vector, entry in zip(self.vectors if self.entries else [], self.entries):
+                    pickle.dump(dict(entry, vector=vector), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path)
+
+    def _append_record(self, vector: np.ndarray, entry: Dict):
+        with self._file_lock:
+            with open(self.path, 'ab') as f:
+                pickle.dump(dict(entry, vector=vector), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def _add(self, vector: np.ndarray, entry: Dict, last_used: float):
+        self.vectors = vector[np.newaxis, :] if self.vectors is None else np.vstack([self.vectors, vector])
+        self.keys = np.append(self.keys, np.array([entry['key']], dtype=object))
+        self.created = np.append(self.created, entry['created'])
+        self.last_used = np.append(self.last_used, last_used)
+        self.entries.append(entry)
+
+    def _remove(self, rows):
+        keep = np.setdiff1d(np.arange(len(self.entries)), rows)
+        self.vectors = self.vectors[keep]
+        self.keys = self.keys[keep]
+        self.created = self.created[keep]
+        self.last_used = self.last_used[keep]
+        self.entries = [self.entries[i] for i in keep]
+
+    def _expire(self, now: float):
+        expired = np.flatnonzero(now - self.created > self.ttl_seconds)
+        if len(expired):
+            self._remove(expired)
+            self.expirations += len(expired)
+
+    def get(self, query_vector, query_type: Optional[str] = None, namespace: str = '') -> Optional[Any]:
+        """Cached answer of the most similar fresh query above the threshold"""
+        now = time.time()
+        with self._lock:
+            if self.entries:
+                scores = self.vectors @ self._normalize(query_vector)
+                unusable = (self.keys != self._key(query_type, namespace)) | (now - self.created > self.ttl_seconds)
+                scores[unusable] = -np.inf
+
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    self.last_used[best] = now
+                    self.hits += 1
+                    return self.entries[best]['answer']
+
+            self.misses += 1
+            return None
+
+    def put(self, query_vector, query: str, answer: Any, query_type: Optional[str] = None, namespace: str = ''):
+        """Store an answer (must be picklable) for the query"""
+        if self.max_size <= 0:
+            return
+
+        now = time.time()
+        vector = self._normalize(query_vector)
+        entry = {'query': query, 'key': self._key(query_type, namespace), 'answer': answer, 'created': now}
+        with self._lock:
+            self._expire(now)
+            if len(self.entries) >= self.max_size:
+                # Drop least recently used entries to make room
+                overflow = len(self.entries) - self.max_size + 1
+                self._remove(np.argsort(self.last_used)[:overflow])
+                self.evictions += overflow
+            self._add(vector, entry, now)
+
+        if self.path:
+            try:
+                self._append_record(vector, entry)
+            except Exception as e:
+                print(f"Error saving answer cache: {e}")
+
+    def clear(self):
+        with self._lock, self._file_lock:
+            self.vectors, self.entries = None, []
+            self.keys = np.zeros(0, dtype=object)
+            self.created = np.zeros(0)
+            self.last_used = np.zeros(0)
+            if self.path and os.path.exists(self.path):
+                os.remove(self.path)
+
+    def get_stats(self) -> Dict:
+        """Get cache usage statistics"""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self.entries),
+            'max_size': self.max_size,
+            'threshold': self.threshold,
+            'hits': self.hits,
+            'misses': self.misses,
+            'expirations': self.expirations,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
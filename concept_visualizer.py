@@ -124,7 +124,7 @@ class ConceptVisualizer:
                                            showarrow=False, x=0.5, y=0.5)
         
         # Group by year and primary category
-        yearly_topics = papers_df.groupby(['year', 'primary_category']).size().unstack(fill_value=0)
+        yearly_topics = papers_df.groupby(['year', 'primary_category'], observed=True).size().unstack(fill_value=0)
         
         # Create stacked area chart
         fig = go.Figure()
@@ -314,6 +314,8 @@ class ConceptVisualizer:
                                            showarrow=False, x=0.5, y=0.5)
         
         category_counts = papers_df['primary_category'].value_counts()
+        # A filtered frame keeps every category of the categorical dtype
+        category_counts = category_counts[category_counts > 0]
         
         # Create pie chart
         fig = go.Figure(data=[go.Pie(
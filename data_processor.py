@@ -1,15 +1,19 @@
 import pandas as pd
 import numpy as np
-import arxiv
 import json
 import pickle
 from datetime import datetime
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sentence_transformers import SentenceTransformer
 import os
 import yaml
-import time
-import random
+
+from embedding_service import get_embedding_service
+from keyword_index import load_or_build_index
+from arxiv_harvester import ArxivHarvester, ArxivFeed
+from knn_graph import load_or_build_graph
+from paper_utils import CONTENT_FIELDS, EMBEDDING_FIELDS, embedding_text, paper_content_hash, text_hash
+from ingestion_pipeline import IngestionPipeline, EmbeddingWriter, IndexWriter, JsonPaperWriter
+import paper_table
 
 class EnhancedArxivProcessor:
     def __init__(self, config_path="config.yaml"):
@@ -20,80 +24,139 @@ class EnhancedArxivProcessor:
         self.max_results = self.data_config['max_papers']
         self.categories = self.data_config['categories']
         
+        # Bumped whenever the paper set is replaced; keys the cached DataFrame
+        self.papers_version = 0
+        self._papers_df = (None, None)
+        
         self.papers = []
         self.embeddings = None
+        self.embedding_rows = {}
         self.metadata = {}
+        self.papers_path = None
+        self.keyword_index = None
+        self.knn_graph = None
         
-        # Initialize models
+        # Initialize models (shared with the RAG system)
         embedding_model = self.config['nlp']['embedding_model']
-        self.sentence_model = SentenceTransformer(embedding_model)
+        self.sentence_model = get_embedding_service(embedding_model)
+    
+    @property
+    def papers(self):
+        """Paper dicts; materialized from the columnar table on first access"""
+        if self._papers is None:
+            self._papers = self.papers_table.to_pylist()
+        return self._papers
+    
+    @papers.setter
+    def papers(self, papers):
+        self._papers = papers
+        self.papers_table_path = None
+        self._papers_table = None
+        self.papers_version += 1
+    
+    @property
+    def papers_table(self):
+        """Arrow table of the Parquet papers file (None for JSON papers); read on first access"""
+        if self._papers_table is None and self.papers_table_path is not None:
+            self._papers_table = paper_table.read_papers(self.papers_table_path)
+        return self._papers_table
+    
+    @property
+    def paper_count(self):
+        if self._papers is None and self.papers_table_path is not None:
+            return paper_table.count_papers(self.papers_table_path)
+        return len(self.papers)
+    
+    def paper_columns(self, columns):
+        """
+        Papers reduced to the given columns, for paths that need only a few
+        fields (ids, embedding text). From a Parquet file only those
+        columns are read; once the full dicts exist they are returned as is.
+        """
+        if self._papers is not None:
+            return self._papers
+        if self._papers_table is not None:
+            return self._papers_table.select(list(columns)).to_pylist()
+        return paper_table.read_papers(self.papers_table_path, columns=columns).to_pylist()
+    
+    def paper_rows(self, rows):
+        """Full paper dicts of the given rows only; from Parquet, taken from the Arrow table"""
+        if self._papers is None and self.papers_table_path is not None:
+            return self.papers_table.take(list(rows)).to_pylist()
+        return [self.papers[row] for row in rows]
+    
+    def paper_hashes(self, model_name):
+        """
+        {'id', 'content_hash'} of every paper, in row order (see paper_utils.paper_content_hash).
+        From Parquet the content columns are streamed batch by batch.
+        """
+        if self._papers is None and self.papers_table_path is not None:
+            batches = paper_table.iter_papers(self.papers_table_path, columns=('id',) + CONTENT_FIELDS)
+            papers = (paper for batch in batches for paper in batch)
+        else:
+            papers = self.papers
+        return [{'id': paper['id'], 'content_hash': paper_content_hash(paper, model_name=model_name)}
+                for paper in papers]
+    
+    @staticmethod
+    def table_path(save_path):
+        """Parquet file kept next to the JSON papers file"""
+        return os.path.splitext(save_path)[0] + ".parquet"
+    
+    def _load_papers_table(self, table_path):
+        self.papers_table_path = table_path
+        self._papers_table = None
+        self._papers = None
+        self.papers_version += 1
+        self.metadata = paper_table.read_metadata(table_path)
+        print(f"Loaded {self.paper_count} papers from {table_path}")
+    
+    def export_papers_json(self, json_path):
+        """Write the current papers in the arxiv_papers.json layout"""
+        with open(json_path, 'w') as f:
+            json.dump({'papers': self.papers, 'metadata': self.metadata}, f, indent=2)
         
-    def fetch_arxiv_papers(self, save_path="arxiv_papers.json", chunk_size=100):
+    def fetch_arxiv_papers(self, save_path="arxiv_papers.json", chunk_size=100, feed=None):
         """
         Fetch papers from arXiv with improved error handling and chunking
+        
+        feed overrides the arXiv API (see arxiv_harvester.LocalFeed).
+        
+        With pyarrow installed, papers are stored as Parquet next to
+        save_path; the JSON file is imported when it is newer.
         """
+        self.papers_path = save_path
+        table_path = self.table_path(save_path)
+        use_table = paper_table.PYARROW_AVAILABLE
+        
+        if use_table and os.path.exists(table_path) and (
+                not os.path.exists(save_path) or os.path.getmtime(table_path) >= os.path.getmtime(save_path)):
+            self._load_papers_table(table_path)
+            return
+        
         if os.path.exists(save_path):
             print(f"Loading existing papers from {save_path}")
             with open(save_path, 'r') as f:
                 data = json.load(f)
                 self.papers = data['papers']
                 self.metadata = data.get('metadata', {})
+            
+            if use_table:
+                paper_table.write_papers(self.papers, table_path, self.metadata)
+                print(f"Imported papers into {table_path}")
             return
         
         print(f"Fetching {self.max_results} papers from arXiv...")
         
-        # Create query for multiple categories
-        query_parts = [f"cat:{cat}" for cat in self.categories]
-        query = " OR ".join(query_parts)
-        
-        papers_data = []
-        failed_attempts = 0
-        max_failures = 3
-        
-        while len(papers_data) < self.max_results and failed_attempts < max_failures:
-            try:
-                remaining = self.max_results - len(papers_data)
-                current_chunk = min(chunk_size, remaining)
-                
-                search = arxiv.Search(
-                    query=query,
-                    max_results=current_chunk,
-                    sort_by=arxiv.SortCriterion.SubmittedDate,
-                    sort_order=arxiv.SortOrder.Descending
-                )
-                
-                chunk_papers = []
-                for result in search.results():
-                    paper = {
-                        'id': result.entry_id.split('/')[-1],
-                        'title': result.title,
-                        'authors': [author.name for author in result.authors],
-                        'abstract': result.summary,
-                        'categories': result.categories,
-                        'published': result.published.isoformat(),
-                        'pdf_url': result.pdf_url,
-                        'primary_category': result.primary_category,
-                        'updated': result.updated.isoformat()
-                    }
-                    chunk_papers.append(paper)
-                
-                if chunk_papers:
-                    papers_data.extend(chunk_papers)
-                    print(f"Fetched {len(chunk_papers)} papers, total: {len(papers_data)}")
-                    failed_attempts = 0  # Reset failure count on success
-                else:
-                    failed_attempts += 1
-                    print(f"Empty response, attempt {failed_attempts}/{max_failures}")
-                
-                # Rate limiting
-                time.sleep(random.uniform(1, 2))
-                
-            except Exception as e:
-                failed_attempts += 1
-                print(f"Error fetching papers (attempt {failed_attempts}): {str(e)}")
-                if failed_attempts < max_failures:
-                    time.sleep(random.uniform(2, 4))
-        
+        # Pages each category with checkpoints, so an interrupted fetch resumes
+        harvester = ArxivHarvester(
+            feed=feed or ArxivFeed(page_size=chunk_size),
+            categories=self.categories,
+            checkpoint_path=save_path + ".harvest.json",
+            max_results=self.max_results,
+            page_size=chunk_size
+        )
+        papers_data = harvester.harvest()
         self.papers = papers_data
         
         # Create metadata
@@ -101,85 +164,301 @@ class EnhancedArxivProcessor:
             'total_papers': len(papers_data),
             'categories': list(set([paper['primary_category'] for paper in papers_data])),
             'fetch_date': datetime.now().isoformat(),
-            'query_used': query
+            'query_used': " OR ".join(f"cat:{cat}" for cat in self.categories)
         }
         
-        # Save to file
-        with open(save_path, 'w') as f:
-            json.dump({
-                'papers': papers_data,
-                'metadata': self.metadata
-            }, f, indent=2)
+        if not harvester.finished:
+            print(f"Harvest stopped early with {len(papers_data)} papers; it resumes on the next run")
+            return
+        
+        # Save to file (JSON only without pyarrow; export_papers_json writes it on demand)
+        if use_table:
+            paper_table.write_papers(papers_data, table_path, self.metadata)
+        else:
+            with open(save_path, 'w') as f:
+                json.dump({
+                    'papers': papers_data,
+                    'metadata': self.metadata
+                }, f, indent=2)
+        harvester.cleanup()
         
         print(f"Successfully fetched and saved {len(papers_data)} papers")
     
-    def create_enhanced_embeddings(self, save_path="enhanced_embeddings.pkl"):
+    def stream_ingest(self, save_path="arxiv_papers.json", embeddings_path="enhanced_embeddings.npy",
+                      rag_system=None, feed=None, progress=None, chunk_size=100):
         """
-        Create enhanced embeddings with metadata
+        Fetch, embed and index papers in one streaming pass (see ingestion_pipeline)
+        
+        Papers move through in data.ingest.batch_size batches, so memory does
+        not grow with the corpus. An existing papers file is re-embedded;
+        otherwise papers are harvested from arXiv and written as they arrive.
+        With rag_system, every batch is also upserted into its stores.
+        
+        The papers file is (re)written from the same de-duplicated batches
+        as the embeddings, so both reload with aligned rows.
         """
-        if os.path.exists(save_path):
-            print(f"Loading existing embeddings from {save_path}")
-            with open(save_path, 'rb') as f:
-                embedding_data = pickle.load(f)
-                self.embeddings = embedding_data['embeddings']
-                self.embedding_metadata = embedding_data.get('metadata', {})
-            return
+        ingest_config = self.data_config.get('ingest', {})
+        table_path = self.table_path(save_path)
+        use_table = paper_table.PYARROW_AVAILABLE
+        sinks = []
+        harvester = None
         
-        print("Creating enhanced embeddings...")
-        
-        # Prepare texts with title and abstract
-        texts = []
-        for paper in self.papers:
-            # Combine title, abstract, and categories for richer embeddings
-            combined_text = f"Title: {paper['title']} Abstract: {paper['abstract']} Categories: {' '.join(paper['categories'])}"
-            texts.append(combined_text)
-        
-        # Create embeddings in batches to handle memory
-        batch_size = 32
-        all_embeddings = []
-        
-        for i in range(0, len(texts), batch_size):
-            batch_texts = texts[i:i+batch_size]
-            batch_embeddings = self.sentence_model.encode(
-                batch_texts,
-                show_progress_bar=True,
-                batch_size=batch_size
+        if os.path.exists(table_path) or os.path.exists(save_path):
+            self.fetch_arxiv_papers(save_path)
+            if self.papers_table_path is not None:
+                source = (paper for batch in paper_table.iter_papers(table_path) for paper in batch)
+            else:
+                source = self.papers
+            metadata = dict(self.metadata)
+        else:
+            harvester = ArxivHarvester(
+                feed=feed or ArxivFeed(page_size=chunk_size),
+                categories=self.categories,
+                checkpoint_path=save_path + ".harvest.json",
+                max_results=self.max_results,
+                page_size=chunk_size,
+                keep_papers=False
             )
-            all_embeddings.extend(batch_embeddings)
+            source = self._harvested_papers(harvester)
             
-            if (i + batch_size) % 100 == 0:
-                print(f"Processed {i + batch_size}/{len(texts)} embeddings")
+            metadata = {
+                'categories': self.categories,
+                'fetch_date': datetime.now().isoformat(),
+                'query_used': " OR ".join(f"cat:{cat}" for cat in self.categories)
+            }
+        sinks.append(paper_table.PaperTableWriter(table_path, metadata) if use_table
+                     else JsonPaperWriter(save_path, metadata))
+        
+        # EmbeddingWriter replaces the .npy, which must not be mapped by then
+        self.embeddings = None
+        sinks.append(EmbeddingWriter(embeddings_path, self.config['nlp']['embedding_model']))
+        if rag_system is not None and rag_system.collection:
+            sinks.append(IndexWriter(rag_system))
+        
+        batch_size = ingest_config.get('batch_size', 256)
+        pipeline = IngestionPipeline(
+            encode=lambda texts: self._encode_texts(texts, show_progress_bar=False),
+            sinks=sinks,
+            batch_size=batch_size,
+            queue_size=ingest_config.get('queue_size', 4),
+            progress=progress
+        )
+        
+        try:
+            stats = pipeline.run(source)
+        except Exception as e:
+            print(f"Error during streaming ingest: {e}")
+            return {}
+        
+        if harvester is not None:
+            harvester.cleanup()
+        
+        # Papers and embeddings were written from the same batches: reload both
+        self.papers_path = save_path
+        if use_table:
+            self._load_papers_table(table_path)
+        else:
+            self.papers = []
+            self.fetch_arxiv_papers(save_path)
         
-        self.embeddings = np.array(all_embeddings)
+        stem = os.path.splitext(embeddings_path)[0]
+        self.embeddings, self.embedding_metadata = self._load_embedding_files(
+            stem + ".npy", stem + ".manifest.json", stem + ".pkl"
+        )
+        self.embedding_rows = self._embedding_rows(self.embedding_metadata['paper_ids'])
+        assert self.paper_count == len(self.embedding_metadata['paper_ids']), \
+            "papers and embeddings are out of step after ingest"
+        return stats
+    
+    @staticmethod
+    def _harvested_papers(harvester):
+        yield from harvester.iter_papers()
+        if not harvester.finished:
+            # Failing the pipeline keeps the partial result from being saved as complete
+            raise RuntimeError(f"Harvest stopped early with {harvester.total} papers; it resumes on the next run")
+    
+    @staticmethod
+    def embedding_text(paper):
+        """Text encoded for a paper: title, abstract and categories"""
+        return embedding_text(paper)
+    
+    def create_enhanced_embeddings(self, save_path="enhanced_embeddings.npy"):
+        """
+        Create enhanced embeddings with metadata
+        
+        The matrix is a raw .npy file opened with mmap_mode='r', so worker
+        processes share its pages through the OS cache. Next to it,
+        <name>.manifest.json records the model, the dimension, and the paper ids
+        and embedding-text hashes aligned with the rows. On load, rows whose
+        paper is new or changed are re-encoded; a different model or
+        dimension re-encodes everything. A legacy <name>.pkl is migrated.
+        """
+        stem = os.path.splitext(save_path)[0]
+        matrix_path = stem + ".npy"
+        manifest_path = stem + ".manifest.json"
+        
+        model_name = self.config['nlp']['embedding_model']
+        papers = self.paper_columns(('id',) + EMBEDDING_FIELDS)
+        texts = [self.embedding_text(paper) for paper in papers]
+        text_hashes = [text_hash(text) for text in texts]
+        
+        # Reusable rows of the existing file, keyed by (paper id, text hash)
+        reusable = {}
+        stored, manifest = self._load_embedding_files(matrix_path, manifest_path, stem + ".pkl")
+        if stored is not None:
+            if manifest.get('model_name') != model_name:
+                print(f"Embeddings were made with {manifest.get('model_name')}, re-encoding with {model_name}")
+            elif 'paper_ids' not in manifest:
+                print("Embeddings have no per-paper manifest, re-encoding")
+            elif manifest.get('embedding_dimension') != self.sentence_model.get_sentence_embedding_dimension():
+                print("Embedding dimension changed, re-encoding")
+            elif (manifest['paper_ids'] == [paper['id'] for paper in papers]
+                  and manifest['text_hashes'] == text_hashes):
+                # Same papers in the same order: use the file as is
+                if not isinstance(stored, np.memmap):
+                    self.embeddings = None
+                    self._save_embeddings(stored, manifest, matrix_path, manifest_path)
+                    stored = np.load(matrix_path, mmap_mode='r')
+                self.embeddings = stored
+                self.embedding_metadata = manifest
+                self.embedding_rows = self._embedding_rows(manifest['paper_ids'])
+                return
+            else:
+                for row, key in enumerate(zip(manifest['paper_ids'], manifest['text_hashes'])):
+                    reusable.setdefault(key, row)
+        
+        keys = [(paper['id'], text_hash) for paper, text_hash in zip(papers, text_hashes)]
+        stale = [i for i, key in enumerate(keys) if key not in reusable]
+        print(f"Encoding {len(stale)} new or changed papers, reusing {len(keys) - len(stale)} embeddings...")
+        
+        # Stale rows are encoded once per distinct text
+        stale_texts = list(dict.fromkeys(texts[i] for i in stale))
+        encoded = dict(zip(stale_texts, self._encode_texts(stale_texts))) if stale_texts else {}
+        
+        dimension = self.sentence_model.get_sentence_embedding_dimension()
+        embeddings = np.zeros((len(papers), dimension), dtype=np.float32)
+        for i, key in enumerate(keys):
+            embeddings[i] = stored[reusable[key]] if key in reusable else encoded[texts[i]]
         
         # Create embedding metadata
         self.embedding_metadata = {
-            'model_name': self.config['nlp']['embedding_model'],
-            'embedding_dimension': self.embeddings.shape[1],
-            'total_papers': len(self.papers),
+            'model_name': model_name,
+            'embedding_dimension': embeddings.shape[1],
+            'total_papers': len(papers),
+            'paper_ids': [paper['id'] for paper in papers],
+            'text_hashes': text_hashes,
             'created_date': datetime.now().isoformat()
         }
         
-        # Save embeddings with metadata
-        embedding_data = {
-            'embeddings': self.embeddings,
-            'metadata': self.embedding_metadata
-        }
-        
-        with open(save_path, 'wb') as f:
-            pickle.dump(embedding_data, f)
+        # Unmap the old file first (Windows cannot replace a mapped file),
+        # save embeddings with metadata, then serve them from the new file
+        stored = None
+        self.embeddings = None
+        self._save_embeddings(embeddings, self.embedding_metadata, matrix_path, manifest_path)
+        self.embeddings = np.load(matrix_path, mmap_mode='r')
+        self.embedding_rows = self._embedding_rows(self.embedding_metadata['paper_ids'])
         
         print(f"Enhanced embeddings created and saved: {self.embeddings.shape}")
     
+    @staticmethod
+    def _load_embedding_files(matrix_path, manifest_path, legacy_path):
+        """(matrix, manifest) from the .npy + manifest pair, else a legacy pickle"""
+        if os.path.exists(matrix_path) and os.path.exists(manifest_path):
+            print(f"Loading existing embeddings from {matrix_path}")
+            with open(manifest_path, 'r') as f:
+                manifest = json.load(f)
+            return np.load(matrix_path, mmap_mode='r'), manifest
+        
+        if os.path.exists(legacy_path):
+            print(f"Migrating pickled embeddings from {legacy_path}")
+            with open(legacy_path, 'rb') as f:
+                embedding_data = pickle.load(f)
+            return np.asarray(embedding_data['embeddings'], dtype=np.float32), embedding_data.get('metadata', {})
+        
+        return None, {}
+    
+    @staticmethod
+    def _save_embeddings(embeddings, manifest, matrix_path, manifest_path):
+        # Write both files before swapping either in
+        np.save(matrix_path + ".tmp.npy", np.asarray(embeddings, dtype=np.float32))
+        with open(manifest_path + ".tmp", 'w') as f:
+            json.dump(manifest, f)
+        os.replace(matrix_path + ".tmp.npy", matrix_path)
+        os.replace(manifest_path + ".tmp", manifest_path)
+    
+    @staticmethod
+    def _embedding_rows(paper_ids):
+        """Paper id -> embedding row (first occurrence)"""
+        rows = {}
+        for row, paper_id in enumerate(paper_ids):
+            rows.setdefault(paper_id, row)
+        return rows
+    
+    def get_paper_embedding(self, paper_id):
+        """Stored embedding of a paper, or None"""
+        row = self.embedding_rows.get(paper_id)
+        return None if row is None else np.asarray(self.embeddings[row])
+    
+    def _encode_texts(self, texts, show_progress_bar=True):
+        """
+        Encode texts with the nlp.encode_batch_size / nlp.encode_workers settings
+        
+        encode_workers > 1 spreads them over CPU processes (token-length sorted
+        first, see EmbeddingService.encode_corpus), 0 uses every core.
+        """
+        nlp_config = self.config['nlp']
+        workers = nlp_config.get('encode_workers', 1) or os.cpu_count() or 1
+        return self.sentence_model.encode_corpus(
+            texts,
+            batch_size=nlp_config.get('encode_batch_size', 32),
+            workers=workers,
+            show_progress_bar=show_progress_bar
+        )
+    
+    def load_keyword_index(self):
+        """
+        Load (or build) the BM25 keyword index persisted next to the papers file
+        """
+        papers_path = self.papers_path or "arxiv_papers.json"
+        index_path = os.path.splitext(papers_path)[0] + ".bm25.pkl"
+        self.keyword_index = load_or_build_index(self.paper_columns(('id', 'title', 'abstract')), index_path)
+        return self.keyword_index
+    
+    def load_knn_graph(self, k=None):
+        """
+        Load (or build) the related-papers kNN graph over the paper embeddings
+        """
+        if k is None:
+            k = self.config['rag'].get('knn_graph_k', 20)
+        papers_path = self.papers_path or "arxiv_papers.json"
+        graph_path = os.path.splitext(papers_path)[0] + ".knn.npz"
+        self.knn_graph = load_or_build_graph(self.embedding_metadata, self.embeddings, graph_path, k)
+        return self.knn_graph
+    
     def get_papers_dataframe(self):
         """
         Convert papers to enhanced pandas DataFrame
+        
+        Built once per papers_version and cached; every call returns the
+        same read-only frame (see paper_table.read_only_frame). Filtering
+        and grouping are fine; callers that modify it must copy() first.
         """
-        df = pd.DataFrame(self.papers)
+        version, df = self._papers_df
+        if version != self.papers_version:
+            df = self._build_papers_dataframe()
+            self._papers_df = (self.papers_version, df)
+        return df
+    
+    def _build_papers_dataframe(self):
+        if self.papers_table is not None:
+            df = paper_table.table_to_pandas(self.papers_table)
+        else:
+            df = pd.DataFrame(self.papers)
         
         # Add derived columns
-        df['year'] = pd.to_datetime(df['published']).dt.year
-        df['month'] = pd.to_datetime(df['published']).dt.month
+        published = pd.to_datetime(df['published'])
+        df['year'] = published.dt.year
+        df['month'] = published.dt.month
         df['author_count'] = df['authors'].apply(len)
         df['abstract_length'] = df['abstract'].apply(len)
         df['title_length'] = df['title'].apply(len)
@@ -188,12 +467,18 @@ class EnhancedArxivProcessor:
         # Extract first author
         df['first_author'] = df['authors'].apply(lambda x: x[0] if x else '')
         
-        return df
+        # Few distinct values, many rows
+        df['primary_category'] = df['primary_category'].astype('category')
+        df['first_author'] = df['first_author'].astype('category')
+        
+        return paper_table.read_only_frame(df)
     
     def get_category_distribution(self):
         """Get distribution of papers by category"""
         df = self.get_papers_dataframe()
-        return df['primary_category'].value_counts()
+        counts = df['primary_category'].value_counts()
+        # Categorical counts list every category, including empty ones
+        return counts[counts > 0]
     
     def get_temporal_distribution(self):
         """Get temporal distribution of papers"""
@@ -0,0 +1,176 @@
+"""
+Process-wide embedding encoder service
+"""
+
+import atexit
+import os
+import threading
+from typing import Dict
+
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+_services: Dict[str, "EmbeddingService"] = {}
+_cross_encoders: Dict[str, "CrossEncoderService"] = {}
+_registry_lock = threading.Lock()
+
+
+class EmbeddingService:
+    """Thin thread-safe wrapper around a single shared SentenceTransformer"""
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name)
+        self.tokenizer = self.model.tokenizer
+
+        # SentenceTransformer/tokenizer objects are not safe to call concurrently
+        self._encode_lock = threading.Lock()
+
+        # CPU worker processes for encode_corpus(workers > 1), started on first use
+        self._pool = None
+        self._pool_workers = 0
+        self._pool_lock = threading.Lock()
+
+    def encode(self, sentences, **kwargs):
+        """Encode sentences with the shared model (serialized across threads)"""
+        with self._encode_lock:
+            return self.model.encode(sentences, **kwargs)
+
+    def token_lengths(self, sentences, batch_size: int = 1024) -> np.ndarray:
+        """Token count of each sentence, capped at the model's max_seq_length"""
+        max_length = self.model.max_seq_length
+        lengths = np.empty(len(sentences), dtype=np.int64)
+        for start in range(0, len(sentences), batch_size):
+            with self._encode_lock:
+                tokens = self.tokenizer(list(sentences[start:start + batch_size]),
+                                        add_special_tokens=False, truncation=False)['input_ids']
+            lengths[start:start + len(tokens)] = [min(len(ids), max_length) for ids in tokens]
+        return lengths
+
+    def encode_corpus(self, sentences, batch_size: int = 32, workers: int = 1,
+                      show_progress_bar: bool = False) -> np.ndarray:
+        """
+        Encode a large list of texts (ingest), returned in input order.
+
+        In one process, SentenceTransformer.encode already sorts its input by
+        length before batching. With workers > 1 the texts are split into
+        contiguous chunks across a pool of CPU processes and each worker only
+        sorts its own chunk, so they are sorted by token length (longest
+        first) beforehand: every chunk then holds texts of similar length and
+        its batches pad to nearly the same length.
+        """
+        if len(sentences) == 0:
+            return np.zeros((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+
+        if workers <= 1 or len(sentences) < workers * batch_size:
+            return np.asarray(self.encode(sentences, batch_size=batch_size, show_progress_bar=show_progress_bar),
+                              dtype=np.float32)
+
+        order = np.argsort(-self.token_lengths(sentences), kind='stable')
+        ordered = [sentences[i] for i in order]
+        with self._pool_lock:
+            pool = self._start_pool(workers)
+            encoded = self.model.encode_multi_process(ordered, pool, batch_size=batch_size)
+
+        embeddings = np.empty((len(sentences), encoded.shape[1]), dtype=np.float32)
+        embeddings[order] = encoded
+        return embeddings
+
+    def _start_pool(self, workers: int):
+        """Process pool with `workers` CPU encoders (called with _pool_lock held)"""
+        if self._pool is not None and self._pool_workers == workers:
+            return self._pool
+        self._stop_pool()
+
+        # One torch thread pool per worker would oversubscribe the cores
+        previous = os.environ.get('OMP_NUM_THREADS')
+        os.environ['OMP_NUM_THREADS'] = str(max(1, (os.cpu_count() or 1) // workers))
+        try:
+            print(f"Starting {workers} encoder processes for {self.model_name}")
+            self._pool = self.model.start_multi_process_pool(target_devices=['cpu'] * workers)
+        finally:
+            if previous is None:
+                os.environ.pop('OMP_NUM_THREADS', None)
+            else:
+                os.environ['OMP_NUM_THREADS'] = previous
+
+        if not self._pool_workers:
+            atexit.register(self.stop_pool)
+        self._pool_workers = workers
+        return self._pool
+
+    def _stop_pool(self):
+        if self._pool is not None:
+            self.model.stop_multi_process_pool(self._pool)
+            self._pool = None
+
+    def stop_pool(self):
+        """Shut down the encoder processes, if any"""
+        with self._pool_lock:
+            self._stop_pool()
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    def memory_footprint(self) -> int:
+        """Approximate resident size of the model weights in bytes"""
+        total = 0
+        for tensor in list(self.model.parameters()) + list(self.model.buffers()):
+            total += tensor.numel() * tensor.element_size()
+        return total
+
+    def get_stats(self) -> Dict:
+        """Get information about the shared encoder"""
+        return {
+            'model_name': self.model_name,
+            'embedding_dimension': self.get_sentence_embedding_dimension(),
+            'memory_mb': round(self.memory_footprint() / (1024 ** 2), 1)
+        }
+
+
+class CrossEncoderService:
+    """Thread-safe wrapper around a single shared CrossEncoder used for reranking"""
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import CrossEncoder
+
+        self.model_name = model_name
+        self.model = CrossEncoder(model_name)
+        self._predict_lock = threading.Lock()
+
+    def predict(self, pairs, **kwargs):
+        """Score (query, document) pairs with the shared model"""
+        with self._predict_lock:
+            return self.model.predict(pairs, **kwargs)
+
+
+def get_embedding_service(model_name: str) -> EmbeddingService:
+    """Get the process-wide encoder for a model, loading it on first use"""
+    service = _services.get(model_name)
+    if service is not None:
+        return service
+
+    with _registry_lock:
+        # Another thread may have loaded it while we waited
+        if model_name not in _services:
+            print(f"Loading embedding model: {model_name}")
+            _services[model_name] = EmbeddingService(model_name)
+        return _services[model_name]
+
+
+def get_cross_encoder(model_name: str) -> CrossEncoderService:
+    """Get the process-wide cross-encoder for a model, loading it on first use"""
+    service = _cross_encoders.get(model_name)
+    if service is not None:
+        return service
+
+    with _registry_lock:
+        if model_name not in _cross_encoders:
+            print(f"Loading cross-encoder model: {model_name}")
+            _cross_encoders[model_name] = CrossEncoderService(model_name)
+        return _cross_encoders[model_name]
+
+
+def loaded_services() -> Dict[str, EmbeddingService]:
+    """Get all encoders loaded in this process"""
+    return dict(_services)
@@ -0,0 +1,283 @@
+"""
+Streaming fetch -> embed -> index ingestion
+
+Papers flow through the pipeline in fixed-size batches instead of three
+full-corpus steps. A producer thread pulls papers from any iterable (the
+arXiv harvester, a Parquet file) and groups them into batches; a bounded
+queue between it and the encoder provides backpressure, so a fast source
+blocks instead of piling up papers. Each encoded batch is handed to the
+sinks and dropped:
+
+- ``EmbeddingWriter`` appends rows to disk and finally writes the .npy +
+  manifest pair that ``create_enhanced_embeddings`` reads;
+- ``paper_table.PaperTableWriter`` / ``JsonPaperWriter`` store the papers;
+- ``IndexWriter`` upserts into the RAG system's vector and metadata stores.
+
+Pipeline memory is about ``queue_size + 1`` batches plus the seen-id set,
+whatever the corpus size, and an index flush only writes its own rows:
+the vector and metadata stores append to what they hold instead of
+rewriting it. Run a full ingest with:
+
+    python ingestion_pipeline.py
+"""
+
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from paper_utils import embedding_text, text_hash
+
+_DONE = object()
+
+
+def iter_batches(papers: Iterable[Dict], batch_size: int) -> Iterator[List[Dict]]:
+    """Group papers into lists of batch_size, skipping repeated ids"""
+    seen = set()
+    batch = []
+    for paper in papers:
+        if paper['id'] in seen:
+            continue
+        seen.add(paper['id'])
+        batch.append(paper)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class EmbeddingWriter:
+    """Append embedding rows to disk; finish() writes <name>.npy and <name>.manifest.json"""
+
+    def __init__(self, save_path: str, model_name: str):
+        stem = os.path.splitext(save_path)[0]
+        self.matrix_path = stem + ".npy"
+        self.manifest_path = stem + ".manifest.json"
+        self.part_path = self.matrix_path + ".part"
+        self.model_name = model_name
+
+        self.paper_ids = []
+        self.text_hashes = []
+        self.dimension = 0
+        self.file = open(self.part_path, 'wb')
+
+    def write(self, papers: List[Dict], embeddings: np.ndarray):
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        self.dimension = embeddings.shape[1]
+        self.file.write(embeddings.tobytes())
+        self.paper_ids.extend(paper['id'] for paper in papers)
+        self.text_hashes.extend(text_hash(embedding_text(paper)) for paper in papers)
+
+    def finish(self):
+        self.file.close()
+        header = {
+            'descr': np.lib.format.dtype_to_descr(np.dtype(np.float32)),
+            'fortran_order': False,
+            'shape': (len(self.paper_ids), self.dimension)
+        }
+
+        # The row count is only known now: prepend the .npy header to the raw rows
+        tmp_matrix = self.matrix_path + ".tmp.npy"
+        with open(tmp_matrix, 'wb') as out, open(self.part_path, 'rb') as rows:
+            np.lib.format.write_array_header_1_0(out, header)
+            shutil.copyfileobj(rows, out, 1 << 20)
+
+        tmp_manifest = self.manifest_path + ".tmp"
+        with open(tmp_manifest, 'w') as f:
+            json.dump({
+                'model_name': self.model_name,
+                'embedding_dimension': self.dimension,
+                'total_papers': len(self.paper_ids),
+                'paper_ids': self.paper_ids,
+                'text_hashes': self.text_hashes,
+                'created_date': datetime.now().isoformat()
+            }, f)
+
+        os.replace(tmp_matrix, self.matrix_path)
+        os.replace(tmp_manifest, self.manifest_path)
+        os.remove(self.part_path)
+
+    def abort(self):
+        self.file.close()
+        os.remove(self.part_path)
+
+
+class JsonPaperWriter:
+    """Write papers in the arxiv_papers.json layout without holding them all"""
+
+    def __init__(self, path: str, metadata: Optional[Dict] = None):
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        self.metadata = metadata or {}
+        self.count = 0
+        self.file = open(self.tmp_path, 'w')
+        self.file.write('{"papers": [')
+
+    def write(self, papers: List[Dict], embeddings=None):
+        for paper in papers:
+            self.file.write((",\n" if self.count else "\n") + json.dumps(paper))
+            self.count += 1
+
+    def finish(self):
+        self.file.write('\n], "metadata": ' + json.dumps(self.metadata) + '}\n')
+        self.file.close()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        self.file.close()
+        os.remove(self.tmp_path)
+
+
+class IndexWriter:
+    """Upsert batches into the RAG system's stores, buffered to flush_size rows"""
+
+    def __init__(self, rag_system, flush_size: int = 1000):
+        self.rag_system = rag_system
+        self.flush_size = max(flush_size, rag_system.collection.add_batch_size)
+        self.papers = []
+        self.embeddings = []
+        self.indexed = 0
+        self.failed = 0
+
+    def write(self, papers: List[Dict], embeddings: np.ndarray):
+        self.papers.extend(papers)
+        self.embeddings.append(np.asarray(embeddings, dtype=np.float32))
+        if len(self.papers) >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        if not self.papers:
+            return
+        if self.rag_system.upsert_papers(self.papers, np.vstack(self.embeddings)):
+            self.indexed += len(self.papers)
+        else:
+            self.failed += len(self.papers)
+        self.papers = []
+        self.embeddings = []
+
+    def finish(self):
+        self.flush()
+
+    def abort(self):
+        # Rows already encoded are still worth keeping
+        self.flush()
+
+
+class IngestionPipeline:
+    def __init__(self, encode: Callable, sinks: List, batch_size: int = 256,
+                 queue_size: int = 4, progress: Optional[Callable] = None):
+        """
+        encode maps a list of texts to an (n, dim) array. Every sink has
+        write(papers, embeddings), finish() and abort(); progress, if
+        given, is called with the stats dict after every batch.
+        """
+        self.encode = encode
+        self.sinks = sinks
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.progress = progress
+
+    def _produce(self, papers: Iterable[Dict], batches: queue.Queue, stop: threading.Event, errors: List):
+        try:
+            for batch in iter_batches(papers, self.batch_size):
+                # Blocks while the encoder is queue_size batches behind
+                while not stop.is_set():
+                    try:
+                        batches.put(batch, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+        except Exception as e:
+            errors.append(e)
+        finally:
+            batches.put(_DONE)
+
+    def run(self, papers: Iterable[Dict]) -> Dict:
+        """Stream papers through encoding into the sinks; returns ingest stats"""
+        batches = queue.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+        errors = []
+        producer = threading.Thread(target=self._produce, args=(papers, batches, stop, errors), daemon=True)
+
+        stats = {'papers': 0, 'batches': 0, 'queued': 0, 'elapsed': 0.0, 'papers_per_second': 0.0}
+        start = time.perf_counter()
+        producer.start()
+
+        try:
+            while True:
+                batch = batches.get()
+                if batch is _DONE:
+                    break
+
+                embeddings = np.asarray(self.encode([embedding_text(paper) for paper in batch]), dtype=np.float32)
+                for sink in self.sinks:
+                    sink.write(batch, embeddings)
+
+                stats['papers'] += len(batch)
+                stats['batches'] += 1
+                stats['queued'] = batches.qsize()
+                stats['elapsed'] = time.perf_counter() - start
+                stats['papers_per_second'] = stats['papers'] / max(stats['elapsed'], 1e-9)
+                if self.progress:
+                    self.progress(dict(stats))
+
+            if errors:
+                raise errors[0]
+        except BaseException:
+            stop.set()
+            for sink in self.sinks:
+                try:
+                    sink.abort()
+                except Exception as e:
+                    print(f"Error aborting {type(sink).__name__}: {e}")
+            raise
+        finally:
+            stop.set()
+            # Unblock a producer waiting on a full queue
+            while producer.is_alive():
+                try:
+                    batches.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+
+        for sink in self.sinks:
+            sink.finish()
+
+        print(f"Ingested {stats['papers']} papers in {stats['elapsed']:.1f}s "
+              f"({stats['papers_per_second']:.1f} papers/s)")
+        return stats
+
+
+def print_progress(stats: Dict):
+    print(f"Ingested {stats['papers']} papers ({stats['papers_per_second']:.1f}/s, "
+          f"{stats['queued']} batches queued)")
+
+
+def main():
+    import argparse
+    from data_processor import EnhancedArxivProcessor
+    from rag_system import RAGSystem
+
+    parser = argparse.ArgumentParser(description="Fetch, embed and index papers in one streaming pass")
+    parser.add_argument('--config', default='config.yaml')
+    parser.add_argument('--papers', default='arxiv_papers.json')
+    parser.add_argument('--embeddings', default='enhanced_embeddings.npy')
+    parser.add_argument('--no-index', action='store_true', help="only write the paper and embedding files")
+    args = parser.parse_args()
+
+    processor = EnhancedArxivProcessor(args.config)
+    rag_system = None if args.no_index else RAGSystem(args.config)
+    processor.stream_ingest(args.papers, args.embeddings, rag_system=rag_system, progress=print_progress)
+
+
+if __name__ == "__main__":
+    main()
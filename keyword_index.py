@@ -0,0 +1,186 @@
+"""
+Inverted-index BM25 keyword search over paper titles and abstracts
+"""
+
+import hashlib
+import math
+import os
+import pickle
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from paper_utils import unique_rows
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOP_WORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'is',
+    'it', 'of', 'on', 'or', 'that', 'the', 'this', 'to', 'we', 'with', 'our'
+}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stop words"""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOP_WORDS]
+
+
+def papers_signature(papers: List[Dict], fields: Sequence[str] = ('title', 'abstract')) -> str:
+    """Fingerprint of the paper ids and indexed text, used to detect a stale persisted index"""
+    digest = hashlib.sha1()
+    for paper in papers:
+        for value in [paper['id']] + [paper.get(field) or '' for field in fields]:
+            digest.update(str(value).encode('utf-8'))
+            digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class BM25Index:
+    """
+    BM25 over an inverted index.
+
+    Each posting list stores document rows and their precomputed BM25 term
+    weight, so a query only touches the postings of its own terms.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_ids = []
+        # Paper row (in the list given to build) of each indexed document
+        self.paper_rows = np.zeros(0, dtype=np.int32)
+        self.postings = {}
+        self.signature = None
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def build(self, papers: List[Dict]):
+        """
+        Tokenize titles and abstracts and build the posting lists.
+
+        Duplicated ids are indexed once (first occurrence), so they neither
+        repeat in results nor skew document frequencies.
+        """
+        paper_rows = unique_rows(papers)
+        signature = papers_signature(papers)
+        papers = [papers[row] for row in paper_rows]
+
+        term_docs = defaultdict(list)
+        term_freqs = defaultdict(list)
+        doc_lengths = np.zeros(len(papers), dtype=np.float32)
+
+        for row, paper in enumerate(papers):
+            tokens = tokenize(f"{paper.get('title', '')} {paper.get('abstract', '')}")
+            doc_lengths[row] = len(tokens)
+            for term, count in Counter(tokens).items():
+                term_docs[term].append(row)
+                term_freqs[term].append(count)
+
+        n_docs = len(papers)
+        avg_length = float(doc_lengths.mean()) if n_docs else 0.0
+        length_norm = self.k1 * (1 - self.b + self.b * doc_lengths / (avg_length or 1.0))
+
+        self.postings = {}
+        for term, rows in term_docs.items():
+            rows = np.asarray(rows, dtype=np.int32)
+            tf = np.asarray(term_freqs[term], dtype=np.float32)
+            idf = math.log(1 + (n_docs - len(rows) + 0.5) / (len(rows) + 0.5))
+            weights = idf * tf * (self.k1 + 1) / (tf + length_norm[rows])
+            self.postings[term] = (rows, weights.astype(np.float32))
+
+        self.doc_ids = [paper['id'] for paper in papers]
+        self.paper_rows = np.asarray(paper_rows, dtype=np.int32)
+        self.signature = signature
+
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[int, float]]:
+        """Return (paper row, BM25 score) pairs, best first; rows index the list given to build"""
+        terms = [term for term in set(tokenize(query)) if term in self.postings]
+        if not terms:
+            return []
+
+        scores = np.zeros(len(self.doc_ids), dtype=np.float32)
+        for term in terms:
+            rows, weights = self.postings[term]
+            scores[rows] += weights
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > top_k:
+            matched = matched[np.argpartition(-scores[matched], top_k - 1)[:top_k]]
+        matched = matched[np.argsort(-scores[matched])]
+
+        return [(int(self.paper_rows[row]), float(scores[row])) for row in matched]
+
+    def save(self, path: str):
+        with open(path, 'wb') as f:
+            pickle.dump({
+                'k1': self.k1,
+                'b': self.b,
+                'doc_ids': self.doc_ids,
+                'paper_rows': self.paper_rows,
+                'postings': self.postings,
+                'signature': self.signature
+            }, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with open(path, 'rb') as f:
+            data = pickle.load(f)
+
+        index = cls(k1=data['k1'], b=data['b'])
+        index.doc_ids = data['doc_ids']
+        index.paper_rows = data.get('paper_rows', np.arange(len(index.doc_ids), dtype=np.int32))
+        index.postings = data['postings']
+        index.signature = data['signature']
+        return index
+
+
+def reciprocal_rank_fusion(result_lists: List[List[Dict]], k: int = 60) -> List[Dict]:
+    """
+    Merge ranked result lists by reciprocal rank, keyed by paper id.
+
+    The first dict seen for a paper is kept and annotated with its
+    'fusion_score'; papers found by several rankers rise to the top.
+    A paper repeated within one list only counts at its best rank.
+    """
+    fused = {}
+    scores = defaultdict(float)
+
+    for results in result_lists:
+        counted = set()
+        for rank, result in enumerate(results):
+            paper_id = result.get('id') or result.get('title', '').lower()
+            if paper_id in counted:
+                continue
+            counted.add(paper_id)
+            scores[paper_id] += 1.0 / (k + rank + 1)
+            fused.setdefault(paper_id, result)
+
+    merged = []
+    for paper_id in sorted(scores, key=scores.get, reverse=True):
+        result = fused[paper_id]
+        result['fusion_score'] = scores[paper_id]
+        merged.append(result)
+
+    return merged
+
+
+def load_or_build_index(papers: List[Dict], path: str) -> BM25Index:
+    """Load the persisted index if it matches the papers, otherwise rebuild it"""
+    if os.path.exists(path):
+        try:
+            index = BM25Index.load(path)
+            if index.signature == papers_signature(papers):
+                print(f"Loaded keyword index from {path}")
+                return index
+            print("Keyword index is stale, rebuilding...")
+        except Exception as e:
+            print(f"Error loading keyword index: {e}")
+
+    index = BM25Index()
+    index.build(papers)
+    index.save(path)
+    print(f"Built keyword index over {len(index)} papers: {path}")
+    return index
@@ -0,0 +1,129 @@
+"""
+Precomputed k-nearest-neighbour graph over paper embeddings
+
+Built once at ingest with a blocked matrix multiply, so "related papers"
+for a known paper is an O(k) lookup with no encoder call or search.
+"""
+
+import hashlib
+import os
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+
+def build_knn_graph(embeddings: np.ndarray, k: int = 20,
+                    block_size: int = 1024) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top-k cosine neighbours of every row, excluding the row itself.
+
+    Returns (neighbors, scores), both (n, k) and sorted best first.
+    """
+    n = len(embeddings)
+    k = min(k, n - 1)
+    if k <= 0:
+        # Empty corpus or a single paper: no neighbours to link
+        return np.empty((n, 0), dtype=np.int32), np.empty((n, 0), dtype=np.float32)
+
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix = matrix / norms
+
+    neighbors = np.empty((n, k), dtype=np.int32)
+    scores = np.empty((n, k), dtype=np.float32)
+
+    for start in range(0, n, block_size):
+        block_scores = matrix[start:start + block_size] @ matrix.T
+        rows = np.arange(len(block_scores))
+        block_scores[rows, start + rows] = -np.inf
+
+        top = np.argpartition(-block_scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(block_scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+
+        neighbors[start:start + len(rows)] = np.take_along_axis(top, order, axis=1)
+        scores[start:start + len(rows)] = np.take_along_axis(top_scores, order, axis=1)
+
+    return neighbors, scores
+
+
+def manifest_rows(manifest: Dict) -> List[int]:
+    """Embedding row of the first occurrence of every paper id in the manifest"""
+    rows = {}
+    for row, paper_id in enumerate(manifest['paper_ids']):
+        rows.setdefault(paper_id, row)
+    return list(rows.values())
+
+
+def graph_signature(manifest: Dict, rows: List[int]) -> str:
+    """Fingerprint of the embedding model and the ids and text hashes of the graph rows"""
+    text_hashes = manifest.get('text_hashes') or [''] * len(manifest['paper_ids'])
+    digest = hashlib.sha1(str(manifest.get('model_name')).encode('utf-8'))
+    for row in rows:
+        digest.update(b'\0' + manifest['paper_ids'][row].encode('utf-8'))
+        digest.update(b'\0' + text_hashes[row].encode('utf-8'))
+    return digest.hexdigest()
+
+
+class PaperGraph:
+    def __init__(self, ids: List[str], neighbors: np.ndarray, scores: np.ndarray, signature: str = None):
+        self.ids = list(ids)
+        self.neighbors = neighbors
+        self.scores = scores
+        self.signature = signature
+        self.id_to_row = {paper_id: row for row, paper_id in enumerate(self.ids)}
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def k(self) -> int:
+        return self.neighbors.shape[1]
+
+    @classmethod
+    def build(cls, manifest: Dict, embeddings: np.ndarray, k: int = 20) -> "PaperGraph":
+        """
+        Graph over the embedding rows described by an embeddings manifest
+        (paper_ids, text_hashes, model_name); duplicated ids keep their first row.
+        """
+        rows = manifest_rows(manifest)
+        neighbors, scores = build_knn_graph(np.asarray(embeddings)[rows], k)
+        return cls([manifest['paper_ids'][row] for row in rows], neighbors, scores,
+                   graph_signature(manifest, rows))
+
+    def similar(self, paper_id: str, k: int = 5) -> List[Tuple[str, float]]:
+        """(paper id, cosine similarity) of the k nearest papers, best first"""
+        row = self.id_to_row.get(paper_id)
+        if row is None:
+            return []
+        return [(self.ids[i], float(score))
+                for i, score in zip(self.neighbors[row, :k], self.scores[row, :k])]
+
+    def save(self, path: str):
+        np.savez(path, ids=np.asarray(self.ids), neighbors=self.neighbors,
+                 scores=self.scores, signature=np.asarray(self.signature))
+
+    @classmethod
+    def load(cls, path: str) -> "PaperGraph":
+        data = np.load(path)
+        return cls(data['ids'].tolist(), data['neighbors'], data['scores'], str(data['signature']))
+
+
+def load_or_build_graph(manifest: Dict, embeddings: np.ndarray, path: str, k: int = 20) -> PaperGraph:
+    """Load the persisted graph if it matches the embeddings manifest, otherwise rebuild it"""
+    if os.path.exists(path):
+        try:
+            graph = PaperGraph.load(path)
+            signature = graph_signature(manifest, manifest_rows(manifest))
+            if graph.signature == signature and graph.k >= min(k, len(graph) - 1):
+                print(f"Loaded kNN graph from {path}")
+                return graph
+            print("kNN graph is stale, rebuilding...")
+        except Exception as e:
+            print(f"Error loading kNN graph: {e}")
+
+    graph = PaperGraph.build(manifest, embeddings, k)
+    graph.save(path)
+    print(f"Built {graph.k}-NN graph over {len(graph)} papers: {path}")
+    return graph
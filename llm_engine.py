@@ -1,7 +1,9 @@
 import yaml
 import json
 import re
-from typing import List, Dict, Any, Optional
+import time
+import asyncio
+from typing import List, Dict, Any, Optional, Tuple
 from dataclasses import dataclass
 from enum import Enum
 
@@ -11,8 +13,9 @@ try:
 except ImportError:
     OLLAMA_AVAILABLE = False
 
-from rag_system import RAGSystem
+from rag_system import RAGSystem, RetrievalContext
 from knowledge_base import CSKnowledgeBase
+from caching import SemanticAnswerCache
 
 class QueryType(Enum):
     FUNDAMENTAL = "fundamental"
@@ -27,6 +30,8 @@ class LLMResponse:
     sources: List[Dict]
     query_type: QueryType
     follow_up_suggestions: List[str]
+    # Retrieval state of the turn (papers, timings); None for fallbacks
+    retrieval: Optional[RetrievalContext] = None
 
 class FoundationLLMEngine:
     def __init__(self, config_path="config.yaml"):
@@ -42,9 +47,25 @@ class FoundationLLMEngine:
         # Setup LLM
         self.setup_llm()
         
-        # Conversation history for context
+        # Conversation history for context (callers may pass their own per session)
         self.conversation_history = []
         
+        # Finished answers reused for paraphrased questions
+        cache_config = self.llm_config.get('answer_cache', {})
+        self.answer_cache = None
+        if cache_config.get('enabled', False):
+            self.answer_cache = SemanticAnswerCache(
+                path=cache_config.get('path', './answer_cache.pkl'),
+                max_size=cache_config.get('max_size', 1000),
+                threshold=cache_config.get('similarity_threshold', 0.92),
+                ttl_seconds=cache_config.get('ttl_hours', 24) * 3600
+            )
+        
+        # Ollama AsyncClient of the event loop it was created on
+        self._async_client = None
+        self._async_client_loop = None
+        self._warmed_up = False
+        
     def setup_llm(self):
         """Setup the foundation LLM (Llama 3 via Ollama)"""
         if not OLLAMA_AVAILABLE:
@@ -119,8 +140,14 @@ class FoundationLLMEngine:
         # Default to fundamental
         return QueryType.FUNDAMENTAL
     
-    def generate_response(self, query: str, context_papers: Optional[List[Dict]] = None) -> LLMResponse:
-        """Generate comprehensive response using foundation LLM + RAG"""
+    def generate_response(self, query: str, context_papers: Optional[List[Dict]] = None,
+                          history: Optional[List[Dict]] = None) -> LLMResponse:
+        """
+        Generate comprehensive response using foundation LLM + RAG
+        
+        history is the conversation to continue (default: the engine's own);
+        the turn's retrieval is returned as response.retrieval.
+        """
         
         if not self.model_name:
             return self.fallback_response(query)
@@ -128,35 +155,185 @@ class FoundationLLMEngine:
         # Classify query
         query_type = self.classify_query(query)
         
-        # Get relevant context
-        if context_papers is None:
-            context_papers = self.rag_system.retrieve_relevant_papers(query)
+        # Paraphrases of an answered question are served from the cache
+        if context_papers is None and self.answer_cache is not None:
+            try:
+                start = time.perf_counter()
+                query_embedding = self.rag_system.encode_query(query)[0]
+                cached = self.cached_response(query, query_type, query_embedding, start, history)
+                if cached is not None:
+                    return cached
+            except Exception as e:
+                print(f"Error checking answer cache: {e}")
+        
+        # Retrieve once for the whole turn; handlers and prompts share it
+        retrieval = self.rag_system.create_retrieval_context(
+            query, papers=context_papers, query_type=query_type.value
+        )
         
         # Generate response based on query type
+        start = time.perf_counter()
+        prompt, response = self.prepare_response(query_type, query, retrieval, history=history)
+        if prompt is not None:
+            response.content = self.call_llm(prompt)
+        retrieval.timings['generate'] = time.perf_counter() - start
+        
+        self.cache_response(query, query_type, retrieval, prompt, response)
+        self.record_turn(query, query_type, response, retrieval, history)
+        return response
+    
+    async def agenerate_response(self, query: str, context_papers: Optional[List[Dict]] = None,
+                                 history: Optional[List[Dict]] = None) -> LLMResponse:
+        """
+        Async variant of generate_response for serving many users from one event loop.
+        
+        Knowledge-base lookup, retrieval (encoder and search run in the
+        loop's default executor) and the one-time model warm-up run
+        concurrently; the LLM call goes through Ollama's AsyncClient.
+        Nothing per-turn is stored on the engine: pass each session's
+        history, and read the retrieval from response.retrieval.
+        """
+        loop = asyncio.get_running_loop()
+        
+        if not self.model_name:
+            return await loop.run_in_executor(None, self.fallback_response, query)
+        
+        query_type = self.classify_query(query)
+        
+        if context_papers is None and self.answer_cache is not None:
+            try:
+                start = time.perf_counter()
+                query_embedding = (await loop.run_in_executor(None, self.rag_system.encode_query, query))[0]
+                cached = self.cached_response(query, query_type, query_embedding, start, history)
+                if cached is not None:
+                    return cached
+            except Exception as e:
+                print(f"Error checking answer cache: {e}")
+        
+        concepts, retrieval, _ = await asyncio.gather(
+            self.alookup_concepts(query, query_type),
+            self.rag_system.acreate_retrieval_context(query, papers=context_papers, query_type=query_type.value),
+            self.awarm_up()
+        )
+        
+        start = time.perf_counter()
+        prompt, response = self.prepare_response(query_type, query, retrieval, concepts, history)
+        if prompt is not None:
+            response.content = await self.acall_llm(prompt)
+        retrieval.timings['generate'] = time.perf_counter() - start
+        
+        self.cache_response(query, query_type, retrieval, prompt, response)
+        self.record_turn(query, query_type, response, retrieval, history)
+        return response
+    
+    def cached_response(self, query: str, query_type: QueryType, query_embedding,
+                        start: float, history: Optional[List[Dict]] = None) -> Optional[LLMResponse]:
+        """Answer of a semantically equivalent earlier question, if one is cached"""
+        answer = self.answer_cache.get(query_embedding, query_type.value, self.answer_cache_namespace())
+        if answer is None:
+            return None
+        
+        response = LLMResponse(
+            content=answer['content'],
+            confidence=answer['confidence'],
+            sources=answer['sources'],
+            query_type=query_type,
+            follow_up_suggestions=answer['follow_up_suggestions']
+        )
+        retrieval = RetrievalContext(
+            query=query,
+            query_embedding=query_embedding,
+            papers=response.sources,
+            timings={'answer_cache': time.perf_counter() - start}
+        )
+        response.retrieval = retrieval
+        self.record_turn(query, query_type, response, retrieval, history)
+        return response
+    
+    def cache_response(self, query: str, query_type: QueryType, retrieval: RetrievalContext,
+                       prompt: Optional[str], response: LLMResponse):
+        """Remember a generated answer; fallbacks and caller-chosen papers are not cached"""
+        if self.answer_cache is None or retrieval.query_embedding is None or prompt is None:
+            return
+        if response.content == self.simple_fallback_response(prompt):
+            return
+        
+        self.answer_cache.put(retrieval.query_embedding, query, {
+            'content': response.content,
+            'confidence': response.confidence,
+            'sources': response.sources,
+            'follow_up_suggestions': response.follow_up_suggestions
+        }, query_type.value, self.answer_cache_namespace())
+    
+    def answer_cache_namespace(self) -> str:
+        """Cached answers are only valid for the model and the indexed papers that produced them"""
+        return f"{self.model_name}\0{self.rag_system.papers_signature}"
+    
+    async def alookup_concepts(self, query: str, query_type: QueryType) -> Optional[List[str]]:
+        """Knowledge-base concepts for the query; only fundamental queries use them"""
+        if query_type != QueryType.FUNDAMENTAL:
+            return None
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.knowledge_base.search_concepts, query)
+    
+    async def awarm_up(self):
+        """Ask Ollama to load the model (an empty prompt) while the first retrieval is running"""
+        if self._warmed_up:
+            return
+        self._warmed_up = True
+        try:
+            await self.get_async_client().generate(model=self.model_name, prompt='')
+        except Exception as e:
+            self._warmed_up = False
+            print(f"Error warming up {self.model_name}: {e}")
+    
+    def get_async_client(self):
+        """Ollama AsyncClient for the running event loop"""
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_client_loop is not loop:
+            self._async_client = ollama.AsyncClient()
+            self._async_client_loop = loop
+        return self._async_client
+    
+    def prepare_response(self, query_type: QueryType, query: str, retrieval: RetrievalContext,
+                         concepts: Optional[List[str]] = None,
+                         history: Optional[List[Dict]] = None) -> Tuple[Optional[str], LLMResponse]:
+        """
+        Build the LLM prompt for a query and the response it will fill in.
+        
+        The prompt is None when the response is already complete.
+        """
         if query_type == QueryType.FUNDAMENTAL:
-            response = self.handle_fundamental_query(query, context_papers)
+            prompt, response = self.prepare_fundamental_query(query, retrieval, concepts, history)
         elif query_type == QueryType.ADVANCED:
-            response = self.handle_advanced_query(query, context_papers)
+            prompt, response = self.prepare_advanced_query(query, retrieval, history)
         elif query_type == QueryType.RECENT:
-            response = self.handle_recent_query(query, context_papers)
+            prompt, response = self.prepare_recent_query(query, retrieval, history)
         else:  # PAPER_SPECIFIC
-            response = self.handle_paper_specific_query(query, context_papers)
-        
-        # Add to conversation history
-        self.conversation_history.append({
+            prompt, response = self.prepare_paper_specific_query(query, retrieval, history)
+        response.retrieval = retrieval
+        return prompt, response
+    
+    def record_turn(self, query: str, query_type: QueryType, response: LLMResponse,
+                    retrieval: RetrievalContext, history: Optional[List[Dict]] = None):
+        """Add a finished turn to the conversation history"""
+        (self.conversation_history if history is None else history).append({
             'query': query,
             'response': response.content,
             'query_type': query_type.value,
-            'timestamp': self.get_timestamp()
+            'timestamp': self.get_timestamp(),
+            'timings': {stage: round(seconds, 4) for stage, seconds in retrieval.timings.items()}
         })
-        
-        return response
     
-    def handle_fundamental_query(self, query: str, papers: List[Dict]) -> LLMResponse:
+    def prepare_fundamental_query(self, query: str, retrieval: RetrievalContext,
+                                  concepts: Optional[List[str]] = None,
+                                  history: Optional[List[Dict]] = None) -> Tuple[str, LLMResponse]:
         """Handle queries about fundamental CS concepts"""
+        papers = retrieval.papers
         
-        # First, check knowledge base
-        concepts = self.knowledge_base.search_concepts(query)
+        # First, check knowledge base (unless the caller already did)
+        if concepts is None:
+            concepts = self.knowledge_base.search_concepts(query)
         base_knowledge = ""
         
         if concepts:
@@ -171,47 +348,45 @@ class FoundationLLMEngine:
                 """
         
         # Create prompt for LLM
-        prompt = self.create_fundamental_prompt(query, base_knowledge, papers[:3])
-        
-        # Generate response
-        response_text = self.call_llm(prompt)
+        prompt = self.create_fundamental_prompt(query, base_knowledge, papers[:3], history)
         
         # Generate follow-up suggestions
         follow_ups = self.generate_follow_up_questions(query, "fundamental")
         
-        return LLMResponse(
-            content=response_text,
+        return prompt, LLMResponse(
+            content="",
             confidence=0.8,
             sources=papers[:3],
             query_type=QueryType.FUNDAMENTAL,
             follow_up_suggestions=follow_ups
         )
     
-    def handle_advanced_query(self, query: str, papers: List[Dict]) -> LLMResponse:
+    def prepare_advanced_query(self, query: str, retrieval: RetrievalContext,
+                               history: Optional[List[Dict]] = None) -> Tuple[str, LLMResponse]:
         """Handle queries about advanced CS topics"""
+        papers = retrieval.papers
         
-        # Create rich context from papers
-        context = self.rag_system.create_context_for_query(query, max_context_length=1500)
+        # Create rich context from the papers already retrieved for this turn
+        context = retrieval.build_context(max_context_length=1500)
         
         # Create advanced prompt
-        prompt = self.create_advanced_prompt(query, context)
-        
-        # Generate response
-        response_text = self.call_llm(prompt)
+        prompt = self.create_advanced_prompt(query, context, history)
         
         # Generate follow-up suggestions
         follow_ups = self.generate_follow_up_questions(query, "advanced")
         
-        return LLMResponse(
-            content=response_text,
+        return prompt, LLMResponse(
+            content="",
             confidence=0.9,
             sources=papers[:5],
             query_type=QueryType.ADVANCED,
             follow_up_suggestions=follow_ups
         )
     
-    def handle_recent_query(self, query: str, papers: List[Dict]) -> LLMResponse:
+    def prepare_recent_query(self, query: str, retrieval: RetrievalContext,
+                             history: Optional[List[Dict]] = None) -> Tuple[str, LLMResponse]:
         """Handle queries about recent developments"""
+        papers = retrieval.papers
         
         # Focus on most recent papers
         recent_papers = sorted(papers, key=lambda x: x.get('published', ''), reverse=True)[:5]
@@ -220,27 +395,26 @@ class FoundationLLMEngine:
         context = self.create_recent_context(recent_papers)
         
         # Create recent-focused prompt
-        prompt = self.create_recent_prompt(query, context)
-        
-        # Generate response
-        response_text = self.call_llm(prompt)
+        prompt = self.create_recent_prompt(query, context, history)
         
         # Generate follow-up suggestions
         follow_ups = self.generate_follow_up_questions(query, "recent")
         
-        return LLMResponse(
-            content=response_text,
+        return prompt, LLMResponse(
+            content="",
             confidence=0.85,
             sources=recent_papers,
             query_type=QueryType.RECENT,
             follow_up_suggestions=follow_ups
         )
     
-    def handle_paper_specific_query(self, query: str, papers: List[Dict]) -> LLMResponse:
+    def prepare_paper_specific_query(self, query: str, retrieval: RetrievalContext,
+                                     history: Optional[List[Dict]] = None) -> Tuple[Optional[str], LLMResponse]:
         """Handle queries about specific papers"""
+        papers = retrieval.papers
         
         if not papers:
-            return LLMResponse(
+            return None, LLMResponse(
                 content="I couldn't find specific papers related to your query. Could you provide more details or try a different search term?",
                 confidence=0.3,
                 sources=[],
@@ -252,23 +426,21 @@ class FoundationLLMEngine:
         top_papers = papers[:3]
         
         # Create paper-specific prompt
-        prompt = self.create_paper_specific_prompt(query, top_papers)
-        
-        # Generate response
-        response_text = self.call_llm(prompt)
+        prompt = self.create_paper_specific_prompt(query, top_papers, history)
         
         # Generate follow-up suggestions
         follow_ups = self.generate_follow_up_questions(query, "paper_specific")
         
-        return LLMResponse(
-            content=response_text,
+        return prompt, LLMResponse(
+            content="",
             confidence=0.9,
             sources=top_papers,
             query_type=QueryType.PAPER_SPECIFIC,
             follow_up_suggestions=follow_ups
         )
     
-    def create_fundamental_prompt(self, query: str, base_knowledge: str, papers: List[Dict]) -> str:
+    def create_fundamental_prompt(self, query: str, base_knowledge: str, papers: List[Dict],
+                                  history: Optional[List[Dict]] = None) -> str:
         """Create prompt for fundamental concepts"""
         
         paper_context = ""
@@ -277,7 +449,7 @@ class FoundationLLMEngine:
             for i, paper in enumerate(papers, 1):
                 paper_context += f"{i}. {paper['title']}\n   Abstract: {paper['document'][:200]}...\n\n"
         
-        conversation_context = self.get_conversation_context()
+        conversation_context = self.get_conversation_context(history=history)
         
         prompt = f"""You are a computer science expert professor. Your task is to provide clear, comprehensive explanations of fundamental CS concepts.
 
@@ -301,10 +473,10 @@ Keep the explanation educational and well-structured. Use examples to make compl
         
         return prompt
     
-    def create_advanced_prompt(self, query: str, context: Dict) -> str:
+    def create_advanced_prompt(self, query: str, context: Dict, history: Optional[List[Dict]] = None) -> str:
         """Create prompt for advanced topics"""
         
-        conversation_context = self.get_conversation_context()
+        conversation_context = self.get_conversation_context(history=history)
         
         prompt = f"""You are a leading computer science researcher with deep expertise in cutting-edge technologies. 
 
@@ -326,10 +498,10 @@ Base your response on the provided research context while incorporating your exp
         
         return prompt
     
-    def create_recent_prompt(self, query: str, context: str) -> str:
+    def create_recent_prompt(self, query: str, context: str, history: Optional[List[Dict]] = None) -> str:
         """Create prompt for recent developments"""
         
-        conversation_context = self.get_conversation_context()
+        conversation_context = self.get_conversation_context(history=history)
         
         prompt = f"""You are a computer science researcher specializing in the latest developments and trends in the field.
 
@@ -351,10 +523,11 @@ Focus on recent findings and emerging trends. Emphasize what's new and significa
         
         return prompt
     
-    def create_paper_specific_prompt(self, query: str, papers: List[Dict]) -> str:
+    def create_paper_specific_prompt(self, query: str, papers: List[Dict],
+                                     history: Optional[List[Dict]] = None) -> str:
         """Create prompt for paper-specific queries"""
         
-        conversation_context = self.get_conversation_context()
+        conversation_context = self.get_conversation_context(history=history)
         
         papers_text = ""
         for i, paper in enumerate(papers, 1):
@@ -397,12 +570,26 @@ Focus on extracting and explaining the most important insights from the research
             response = ollama.generate(
                 model=self.model_name,
                 prompt=prompt,
-                options={
-                    'temperature': self.llm_config['temperature'],
-                    'max_tokens': self.llm_config['max_tokens'],
-                    'top_p': 0.9,
-                    'stop': ['Human:', 'User:']
-                }
+                options=self.generation_options()
+            )
+            
+            return response['response'].strip()
+            
+        except Exception as e:
+            print(f"Error calling LLM: {e}")
+            return self.simple_fallback_response(prompt)
+    
+    async def acall_llm(self, prompt: str) -> str:
+        """Call the foundation LLM without blocking the event loop"""
+        
+        if not self.model_name:
+            return self.simple_fallback_response(prompt)
+        
+        try:
+            response = await self.get_async_client().generate(
+                model=self.model_name,
+                prompt=prompt,
+                options=self.generation_options()
             )
             
             return response['response'].strip()
@@ -411,6 +598,14 @@ Focus on extracting and explaining the most important insights from the research
             print(f"Error calling LLM: {e}")
             return self.simple_fallback_response(prompt)
     
+    def generation_options(self) -> Dict:
+        return {
+            'temperature': self.llm_config['temperature'],
+            'max_tokens': self.llm_config['max_tokens'],
+            'top_p': 0.9,
+            'stop': ['Human:', 'User:']
+        }
+    
     def generate_follow_up_questions(self, query: str, query_type: str) -> List[str]:
         """Generate contextual follow-up questions"""
         
@@ -439,12 +634,14 @@ Focus on extracting and explaining the most important insights from the research
         
         return base_questions.get(query_type, base_questions["fundamental"])
     
-    def get_conversation_context(self, max_turns: int = 3) -> str:
-        """Get recent conversation context"""
-        if not self.conversation_history:
+    def get_conversation_context(self, max_turns: int = 3, history: Optional[List[Dict]] = None) -> str:
+        """Get recent conversation context (of history, default: the engine's own)"""
+        if history is None:
+            history = self.conversation_history
+        if not history:
             return ""
         
-        recent_history = self.conversation_history[-max_turns:]
+        recent_history = history[-max_turns:]
         context = "Previous conversation context:\n"
         
         for turn in recent_history:
@@ -510,5 +707,6 @@ Focus on extracting and explaining the most important insights from the research
         return {
             'model_name': self.model_name,
             'available': self.model_name is not None,
-            'conversation_turns': len(self.conversation_history)
+            'conversation_turns': len(self.conversation_history),
+            'answer_cache': self.answer_cache.get_stats() if self.answer_cache is not None else None
         }
@@ -0,0 +1,144 @@
+"""
+Separate title and abstract vectors with weighted score fusion
+
+A single "Title: ... Abstract: ..." vector lets long abstracts drown out
+short, title-style queries. Here every paper gets a title vector and an
+abstract vector, kept in two (n, dim) files. A query q scores
+wt * cos(q, title) + wa * cos(q, abstract), so the weights can be
+changed without rebuilding. The title file alone can serve as a cheap
+first-stage filter: only the candidates' abstract rows are then read.
+"""
+
+import hashlib
+import json
+import os
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from keyword_index import papers_signature
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[np.newaxis, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def index_signature(papers: List[Dict], model_name: str, dim: int) -> str:
+    """Fingerprint of the paper ids and texts plus the encoder that embedded them"""
+    return hashlib.sha1(f"{model_name}\0{dim}\0{papers_signature(papers)}".encode('utf-8')).hexdigest()
+
+
+class MultiFieldIndex:
+    def __init__(self, path="./multi_field_index", title_weight=0.4, abstract_weight=0.6):
+        self.path = path
+        self.titles_path = os.path.join(path, "titles.npy")
+        self.abstracts_path = os.path.join(path, "abstracts.npy")
+        self.map_path = os.path.join(path, "fields.json")
+
+        total = (title_weight + abstract_weight) or 1.0
+        self.title_weight = title_weight / total
+        self.abstract_weight = abstract_weight / total
+
+        self.ids = []
+        self.signature = None
+        self.dim = 0
+        self.titles = None
+        self.abstracts = None
+
+        self.load()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def load(self):
+        """Load a previously built index if one exists"""
+        paths = (self.titles_path, self.abstracts_path, self.map_path)
+        if not all(os.path.exists(path) for path in paths):
+            return False
+
+        with open(self.map_path, 'r') as f:
+            field_map = json.load(f)
+
+        self.ids = field_map['ids']
+        self.signature = field_map['signature']
+        self.titles = np.load(self.titles_path, mmap_mode='r')
+        self.abstracts = np.load(self.abstracts_path, mmap_mode='r')
+        self.dim = self.titles.shape[1]
+        print(f"Loaded multi-field index: {len(self.ids)} papers")
+        return True
+
+    def matches(self, papers: List[Dict], model_name: str, dim: int) -> bool:
+        """True if the index was built from exactly these papers with this encoder"""
+        return self.titles is not None and self.signature == index_signature(papers, model_name, dim)
+
+    def build(self, papers: List[Dict], encode: Callable, model_name: str = '', batch_size: int = 64):
+        """Encode titles and abstracts separately and persist one file per field"""
+        print(f"Encoding titles and abstracts of {len(papers)} papers...")
+
+        title_blocks = []
+        abstract_blocks = []
+        for i in range(0, len(papers), batch_size):
+            batch = papers[i:i + batch_size]
+            title_blocks.append(_normalize_rows(encode([paper['title'] for paper in batch])))
+            abstract_blocks.append(_normalize_rows(encode([paper.get('abstract') or paper['title'] for paper in batch])))
+        titles = np.vstack(title_blocks)
+
+        # Drop the mapped files before replacing them
+        self.titles = self.abstracts = None
+        os.makedirs(self.path, exist_ok=True)
+        np.save(self.titles_path, titles)
+        np.save(self.abstracts_path, np.vstack(abstract_blocks))
+        with open(self.map_path, 'w') as f:
+            json.dump({
+                'ids': [paper['id'] for paper in papers],
+                'signature': index_signature(papers, model_name, titles.shape[1])
+            }, f)
+
+        self.load()
+
+    def _fused_scores(self, queries: np.ndarray, rows=None) -> np.ndarray:
+        """wt * title score + wa * abstract score of the given rows (all rows if None)"""
+        titles = self.titles if rows is None else np.asarray(self.titles[rows])
+        abstracts = self.abstracts if rows is None else np.asarray(self.abstracts[rows])
+        return self.title_weight * (queries @ titles.T) + self.abstract_weight * (queries @ abstracts.T)
+
+    def search(self, query_embeddings: np.ndarray, n_results: int = 10, prefilter: int = 0) -> Dict:
+        """
+        Rank papers by fused title/abstract score, in the vector store layout.
+
+        With prefilter > 0 only the best `prefilter` rows by title score
+        are fused-scored; the full scan then reads only the title file.
+        """
+        results = {'ids': [], 'distances': []}
+        if self.titles is None or not self.ids:
+            return results
+
+        queries = _normalize_rows(query_embeddings)
+        n_results = min(n_results, len(self.ids))
+
+        if prefilter <= 0 or prefilter >= len(self.ids):
+            all_scores = self._fused_scores(queries)
+            candidate_rows = [None] * len(queries)
+        else:
+            title_scores = queries @ self.titles.T
+            candidate_rows = np.sort(np.argpartition(-title_scores, prefilter - 1, axis=1)[:, :prefilter], axis=1)
+            all_scores = [
+                self._fused_scores(query[np.newaxis, :], rows)[0]
+                for rows, query in zip(candidate_rows, queries)
+            ]
+
+        for scores, rows in zip(all_scores, candidate_rows):
+            k = min(n_results, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            top_rows = top if rows is None else rows[top]
+
+            results['ids'].append([self.ids[row] for row in top_rows])
+            results['distances'].append((1.0 - scores[top]).tolist())
+
+        return results
@@ -0,0 +1,149 @@
+"""
+Id-keyed paper metadata store
+
+Vector stores only keep the fields they filter on (year, primary
+category) plus a content hash. Everything displayed or sent to the LLM
+lives here instead: a SQLite table with list fields stored as JSON,
+loaded once into in-memory columns so hydrating a search hit is one
+list lookup per requested field.
+"""
+
+import json
+import os
+import sqlite3
+from contextlib import closing
+from typing import Dict, List, Optional, Sequence
+
+# Stored columns, in table order
+PAPER_FIELDS = ('title', 'abstract', 'authors', 'categories', 'published', 'primary_category', 'pdf_url')
+LIST_FIELDS = ('authors', 'categories')
+
+# Keys of a retrieved paper dict; 'document' is title and abstract joined
+RESULT_FIELDS = ('title', 'document', 'authors', 'categories', 'published', 'primary_category', 'pdf_url')
+
+
+class PaperMetadataStore:
+    def __init__(self, path="./paper_metadata.db"):
+        self.path = path
+
+        # (id -> row, field -> column); swapped as one tuple so readers never see a half-built view
+        self._view = ({}, {field: [] for field in PAPER_FIELDS})
+
+        self._create_table()
+        self.load()
+
+    def __len__(self):
+        return len(self._view[0])
+
+    def __contains__(self, paper_id):
+        return paper_id in self._view[0]
+
+    @property
+    def ids(self) -> List[str]:
+        return list(self._view[0])
+
+    def _connect(self):
+        return closing(sqlite3.connect(self.path))
+
+    def _create_table(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._connect() as conn, conn:
+            columns = ', '.join(f"{field} TEXT" for field in PAPER_FIELDS)
+            conn.execute(f"CREATE TABLE IF NOT EXISTS papers (id TEXT PRIMARY KEY, {columns})")
+
+    def load(self):
+        """Read the whole table into columns keyed by row"""
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT id, {', '.join(PAPER_FIELDS)} FROM papers ORDER BY rowid").fetchall()
+
+        id_to_row = {}
+        columns = {field: [] for field in PAPER_FIELDS}
+        for row in rows:
+            id_to_row[row[0]] = len(id_to_row)
+            for field, value in zip(PAPER_FIELDS, row[1:]):
+                columns[field].append(json.loads(value) if field in LIST_FIELDS else value)
+
+        self._view = (id_to_row, columns)
+
+    def upsert(self, papers: List[Dict]):
+        """
+        Insert or replace papers and apply them to the in-memory columns.
+
+        Only the batch is touched: new papers are appended to the columns
+        before their id becomes visible, replaced ones are overwritten.
+        """
+        if not papers:
+            return
+
+        # A repeated id keeps its last version, as INSERT OR REPLACE would
+        papers = list({paper['id']: paper for paper in papers}.values())
+
+        rows = []
+        for paper in papers:
+            values = []
+            for field in PAPER_FIELDS:
+                value = paper.get(field)
+                values.append(json.dumps(list(value or [])) if field in LIST_FIELDS else value)
+            rows.append([paper['id']] + values)
+
+        placeholders = ', '.join('?' * (len(PAPER_FIELDS) + 1))
+        with self._connect() as conn, conn:
+            conn.executemany(
+                f"UPDATE papers SET {', '.join(f'{field} = ?' for field in PAPER_FIELDS)} WHERE id = ?",
+                [row[1:] + row[:1] for row in rows]
+            )
+            conn.executemany(
+                f"INSERT OR IGNORE INTO papers (id, {', '.join(PAPER_FIELDS)}) VALUES ({placeholders})",
+                rows
+            )
+
+        id_to_row, columns = self._view
+        for paper in papers:
+            values = {field: list(paper.get(field) or []) if field in LIST_FIELDS else paper.get(field)
+                      for field in PAPER_FIELDS}
+            row = id_to_row.get(paper['id'])
+            if row is None:
+                for field in PAPER_FIELDS:
+                    columns[field].append(values[field])
+                id_to_row[paper['id']] = len(columns[PAPER_FIELDS[0]]) - 1
+            else:
+                for field in PAPER_FIELDS:
+                    columns[field][row] = values[field]
+
+    def delete(self, ids: List[str]):
+        if not ids:
+            return
+
+        with self._connect() as conn, conn:
+            conn.executemany("DELETE FROM papers WHERE id = ?", [(paper_id,) for paper_id in ids])
+        self.load()
+
+    def hydrate(self, ids: List[str], fields: Sequence[str] = RESULT_FIELDS) -> List[Optional[Dict]]:
+        """
+        Paper dicts with only the requested fields, aligned with ids.
+
+        Unknown ids give None. List fields are returned as stored, so
+        callers must not mutate them.
+        """
+        id_to_row, columns = self._view
+        stored_fields = [field for field in fields if field in columns]
+        with_document = 'document' in fields
+
+        papers = []
+        for paper_id in ids:
+            row = id_to_row.get(paper_id)
+            if row is None:
+                papers.append(None)
+                continue
+
+            paper = {'id': paper_id}
+            for field in stored_fields:
+                paper[field] = columns[field][row]
+            if with_document:
+                paper['document'] = f"{columns['title'][row]} {columns['abstract'][row]}"
+            papers.append(paper)
+
+        return papers
@@ -0,0 +1,139 @@
+"""
+Columnar on-disk paper store (Parquet via pyarrow)
+
+Papers are kept as one Arrow table instead of a pretty-printed JSON list:
+loading skips JSON parsing, readers can project just the columns they
+need, and the file can be memory-mapped. arxiv_papers.json stays the
+import/export format.
+"""
+
+import json
+import os
+from typing import Dict, List, Optional, Sequence
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+LIST_COLUMNS = ('authors', 'categories')
+METADATA_KEY = b'papers_metadata'
+
+
+def paper_schema() -> "pa.Schema":
+    return pa.schema([
+        ('id', pa.string()),
+        ('title', pa.string()),
+        ('authors', pa.list_(pa.string())),
+        ('abstract', pa.string()),
+        ('categories', pa.list_(pa.string())),
+        ('published', pa.string()),
+        ('pdf_url', pa.string()),
+        ('primary_category', pa.string()),
+        ('updated', pa.string())
+    ])
+
+
+def write_papers(papers: List[Dict], path: str, metadata: Optional[Dict] = None):
+    """Write papers (and the fetch metadata) to a Parquet file, atomically"""
+    table = pa.Table.from_pylist(papers, schema=paper_schema())
+    table = table.replace_schema_metadata({METADATA_KEY: json.dumps(metadata or {})})
+
+    tmp_path = path + ".tmp"
+    pq.write_table(table, tmp_path, compression='zstd')
+    os.replace(tmp_path, path)
+
+
+class PaperTableWriter:
+    """Write papers to a Parquet file batch by batch; the file appears on finish()"""
+
+    def __init__(self, path: str, metadata: Optional[Dict] = None):
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        self.schema = paper_schema().with_metadata({METADATA_KEY: json.dumps(metadata or {})})
+        self.writer = pq.ParquetWriter(self.tmp_path, self.schema, compression='zstd')
+
+    def write(self, papers: List[Dict], embeddings=None):
+        """Append a batch (embeddings are ignored; accepted as an ingestion sink)"""
+        self.writer.write_table(pa.Table.from_pylist(papers, schema=self.schema))
+
+    def finish(self):
+        self.writer.close()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        self.writer.close()
+        os.remove(self.tmp_path)
+
+
+def iter_papers(path: str, batch_size: int = 1024, columns: Optional[Sequence[str]] = None):
+    """Stream the paper table as lists of paper dicts, one record batch at a time"""
+    columns = list(columns) if columns else None
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size, columns=columns):
+        yield batch.to_pylist()
+
+
+def read_papers(path: str, columns: Optional[Sequence[str]] = None, memory_map: bool = True) -> "pa.Table":
+    """Read the paper table, optionally only some columns"""
+    return pq.read_table(path, columns=list(columns) if columns else None, memory_map=memory_map)
+
+
+def count_papers(path: str) -> int:
+    """Row count from the Parquet footer, without reading any column"""
+    return pq.read_metadata(path).num_rows
+
+
+def read_metadata(path: str) -> Dict:
+    schema_metadata = pq.read_schema(path).metadata or {}
+    return json.loads(schema_metadata.get(METADATA_KEY, b'{}'))
+
+
+def table_to_pandas(table: "pa.Table"):
+    """DataFrame of the table with list columns as Python lists (not arrays)"""
+    df = table.to_pandas()
+    for column in LIST_COLUMNS:
+        if column in table.column_names:
+            df[column] = table.column(column).to_pylist()
+    return df
+
+
+def read_only_frame(df):
+    """
+    Copy of df whose column arrays are not writeable, so a frame shared by
+    many readers cannot be changed in place. Callers that need to modify
+    it work on df.copy(); list cells are shared and must not be mutated.
+    """
+    import pandas as pd
+
+    columns = {}
+    for column in df.columns:
+        series = df[column]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            codes = series.cat.codes.to_numpy(copy=True)
+            codes.flags.writeable = False
+            columns[column] = pd.Categorical.from_codes(codes, dtype=series.dtype)
+        else:
+            # Text stays object dtype: converting it would copy into a writeable array
+            text = series.dtype == object or pd.api.types.is_string_dtype(series.dtype)
+            values = series.to_numpy(dtype=object if text else None, copy=True)
+            values.flags.writeable = False
+            columns[column] = pd.Series(values, index=df.index, dtype=values.dtype, copy=False)
+    return pd.DataFrame(columns, copy=False)
+
+
+def import_json(json_path: str, table_path: str) -> int:
+    """Convert a {'papers': [...], 'metadata': {...}} JSON file to Parquet"""
+    with open(json_path, 'r') as f:
+        data = json.load(f)
+    write_papers(data['papers'], table_path, data.get('metadata', {}))
+    return len(data['papers'])
+
+
+def export_json(table_path: str, json_path: str) -> int:
+    """Write the Parquet papers back out in the JSON layout"""
+    papers = read_papers(table_path).to_pylist()
+    with open(json_path, 'w') as f:
+        json.dump({'papers': papers, 'metadata': read_metadata(table_path)}, f, indent=2)
+    return len(papers)
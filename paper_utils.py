@@ -0,0 +1,48 @@
+"""
+Helpers shared by the components that store or index papers
+"""
+
+import hashlib
+import json
+from typing import Dict, List, Sequence
+
+# Fields that end up in the vector store document or metadata
+CONTENT_FIELDS = ('title', 'abstract', 'authors', 'categories', 'published', 'primary_category')
+
+
+def paper_content_hash(paper: Dict, fields: Sequence[str] = CONTENT_FIELDS, model_name: str = '') -> str:
+    """
+    Stable hash of the given paper fields, used to skip unchanged papers.
+
+    model_name is the embedding model of the stored vector, so switching
+    models changes every hash and re-upserts every paper.
+    """
+    content = {field: paper.get(field) for field in fields}
+    content['embedding_model'] = model_name
+    serialized = json.dumps(content, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(serialized.encode('utf-8')).hexdigest()
+
+
+# Fields read by embedding_text
+EMBEDDING_FIELDS = ('title', 'abstract', 'categories')
+
+
+def embedding_text(paper: Dict) -> str:
+    """Text encoded for a paper: title, abstract and categories"""
+    return f"Title: {paper['title']} Abstract: {paper['abstract']} Categories: {' '.join(paper['categories'])}"
+
+
+def text_hash(text: str) -> str:
+    """Hash of an embedding text, recorded per row in the embeddings manifest"""
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def unique_rows(papers: List[Dict]) -> List[int]:
+    """Row of the first occurrence of every paper id, in order"""
+    seen = set()
+    rows = []
+    for row, paper in enumerate(papers):
+        if paper['id'] not in seen:
+            seen.add(paper['id'])
+            rows.append(row)
+    return rows
@@ -0,0 +1,152 @@
+"""
+Passage-level index with parent-paper aggregation
+
+Documents are split into passages, each passage gets its own compact
+(float16) vector, and at query time passage scores are folded back into
+one score per paper. Only the best passages of each hit are kept for the
+prompt, so long documents do not blow up the LLM context.
+"""
+
+import json
+import os
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from keyword_index import papers_signature
+from paper_utils import unique_rows
+
+# Paper fields the passages are cut from
+TEXT_FIELDS = ('title', 'abstract', 'full_text')
+
+
+class PassageIndex:
+    def __init__(self, path="./passage_index", aggregation="max", passages_per_paper=2):
+        self.path = path
+        self.matrix_path = os.path.join(path, "passages.npy")
+        self.map_path = os.path.join(path, "passage_map.json")
+
+        self.aggregation = aggregation
+        self.passages_per_paper = passages_per_paper
+
+        self.paper_ids = []
+        self.passages = []
+        self.passage_paper = np.zeros(0, dtype=np.int32)
+        self.matrix = None
+        self.signature = None
+
+        self.load()
+
+    def __len__(self):
+        return len(self.passages)
+
+    def load(self):
+        """Load a previously built index if one exists"""
+        if not (os.path.exists(self.matrix_path) and os.path.exists(self.map_path)):
+            return False
+
+        with open(self.map_path, 'r') as f:
+            passage_map = json.load(f)
+
+        self.paper_ids = passage_map['paper_ids']
+        self.passages = passage_map['passages']
+        self.passage_paper = np.asarray(passage_map['passage_paper'], dtype=np.int32)
+        self.signature = passage_map.get('signature')
+        self.matrix = np.load(self.matrix_path, mmap_mode='r')
+        print(f"Loaded passage index: {len(self.passages)} passages from {len(self.paper_ids)} papers")
+        return True
+
+    @staticmethod
+    def _unique_papers(papers: List[Dict]) -> List[Dict]:
+        """Duplicated ids keep their first occurrence"""
+        return [papers[row] for row in unique_rows(papers)]
+
+    def matches(self, papers: List[Dict]) -> bool:
+        """Whether the index was built from exactly these papers and texts"""
+        return self.matrix is not None and self.signature == papers_signature(self._unique_papers(papers), TEXT_FIELDS)
+
+    def build(self, papers: List[Dict], encode: Callable, chunker: Callable, batch_size: int = 64):
+        """Chunk every paper (once per id), encode the passages and persist the index"""
+        papers = self._unique_papers(papers)
+        paper_ids = []
+        passages = []
+        passage_paper = []
+
+        for paper in papers:
+            # Prefer full text when the paper record carries it
+            text = paper.get('full_text') or paper.get('abstract', '')
+            chunks = chunker(text) or [paper['title']]
+
+            paper_idx = len(paper_ids)
+            paper_ids.append(paper['id'])
+            for chunk in chunks:
+                passages.append(chunk)
+                passage_paper.append(paper_idx)
+
+        print(f"Encoding {len(passages)} passages from {len(paper_ids)} papers...")
+
+        vectors = []
+        for i in range(0, len(passages), batch_size):
+            batch = np.asarray(encode(passages[i:i + batch_size]), dtype=np.float32)
+            norms = np.linalg.norm(batch, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            vectors.append((batch / norms).astype(np.float16))
+
+        os.makedirs(self.path, exist_ok=True)
+        np.save(self.matrix_path, np.vstack(vectors))
+        with open(self.map_path, 'w') as f:
+            json.dump({
+                'paper_ids': paper_ids,
+                'passages': passages,
+                'passage_paper': passage_paper,
+                'signature': papers_signature(papers, TEXT_FIELDS)
+            }, f)
+
+        self.load()
+
+    def _score_passages(self, query_vector: np.ndarray, block_size: int = 65536) -> np.ndarray:
+        """Cosine score of every passage; float16 rows are widened block by block"""
+        query_vector = np.asarray(query_vector, dtype=np.float32).ravel()
+        query_vector = query_vector / (np.linalg.norm(query_vector) or 1.0)
+
+        scores = np.empty(len(self.passages), dtype=np.float32)
+        for start in range(0, len(self.passages), block_size):
+            block = np.asarray(self.matrix[start:start + block_size], dtype=np.float32)
+            scores[start:start + block_size] = block @ query_vector
+        return scores
+
+    def search(self, query_vector: np.ndarray, top_k: int = 5) -> List[Dict]:
+        """Rank papers by aggregated passage score"""
+        if self.matrix is None or not self.passages or top_k <= 0:
+            return []
+
+        scores = self._score_passages(query_vector)
+
+        # Fold passage scores into their parent papers
+        if self.aggregation == 'sum':
+            paper_scores = np.zeros(len(self.paper_ids), dtype=np.float32)
+            np.add.at(paper_scores, self.passage_paper, np.maximum(scores, 0))
+        else:
+            paper_scores = np.full(len(self.paper_ids), -np.inf, dtype=np.float32)
+            np.maximum.at(paper_scores, self.passage_paper, scores)
+
+        k = min(top_k, len(self.paper_ids))
+        top = np.argpartition(-paper_scores, k - 1)[:k]
+        top = top[np.argsort(-paper_scores[top])]
+
+        # Best passages of the selected papers only
+        selected = np.isin(self.passage_paper, top)
+        candidate_passages = np.flatnonzero(selected)
+        candidate_passages = candidate_passages[np.argsort(-scores[candidate_passages])]
+
+        best_passages = {int(paper_idx): [] for paper_idx in top}
+        for passage_idx in candidate_passages:
+            kept = best_passages[int(self.passage_paper[passage_idx])]
+            if len(kept) < self.passages_per_paper:
+                kept.append(self.passages[passage_idx])
+
+        return [{
+            'id': self.paper_ids[paper_idx],
+            'score': float(paper_scores[paper_idx]),
+            'passages': best_passages[int(paper_idx)]
+        } for paper_idx in top]
@@ -1,11 +1,111 @@
 import numpy as np
 from sklearn.metrics.pairwise import cosine_similarity
-import chromadb
 import uuid
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Callable
+from dataclasses import dataclass, field
 import yaml
 import os
-from sentence_transformers import SentenceTransformer
+import time
+import asyncio
+import functools
+import hashlib
+
+from embedding_service import get_embedding_service, get_cross_encoder
+from caching import LRUCache, normalize_query
+from vector_store import create_vector_store
+from passage_index import PassageIndex
+from multi_field_index import MultiFieldIndex
+from paper_store import PaperMetadataStore, RESULT_FIELDS
+from paper_utils import paper_content_hash, unique_rows
+
+
+def build_context_from_papers(papers: List[Dict], max_context_length: int = 2000) -> Dict:
+    """Create prompt context from already-retrieved papers"""
+    context_parts = []
+    total_length = 0
+    used_papers = []
+    
+    for paper in papers:
+        # Create paper summary for context
+        paper_context = f"Title: {paper['title']}\n"
+        paper_context += f"Abstract: {paper['document'].split('Abstract:')[1] if 'Abstract:' in paper['document'] else paper['document']}\n"
+        paper_context += f"Categories: {', '.join(paper['categories'])}\n\n"
+        
+        # With a passage index only the best-matching passages are sent
+        if paper.get('passages'):
+            paper_context = f"Title: {paper['title']}\n"
+            paper_context += f"Relevant passages: {' ... '.join(paper['passages'])}\n"
+            paper_context += f"Categories: {', '.join(paper['categories'])}\n\n"
+        
+        # Check if adding this paper would exceed context length
+        if total_length + len(paper_context.split()) > max_context_length:
+            break
+            
+        context_parts.append(paper_context)
+        used_papers.append(paper)
+        total_length += len(paper_context.split())
+    
+    context = {
+        'text': '\n'.join(context_parts),
+        'papers': used_papers,
+        'total_papers': len(used_papers)
+    }
+    
+    return context
+
+
+def maximal_marginal_relevance(relevance: np.ndarray, vectors: np.ndarray, k: int,
+                               lambda_mult: float = 0.7) -> List[int]:
+    """
+    Greedy MMR selection over candidate vectors.
+    
+    Each step picks the candidate maximizing
+    lambda * relevance - (1 - lambda) * max cosine to the already selected,
+    using one precomputed candidate-candidate similarity matrix.
+    """
+    n = len(relevance)
+    k = min(k, n)
+    if k <= 0:
+        return []
+    
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    unit = vectors / norms
+    similarity = unit @ unit.T
+    
+    selected = [int(np.argmax(relevance))]
+    max_similarity = similarity[selected[0]].copy()
+    available = np.ones(n, dtype=bool)
+    available[selected[0]] = False
+    
+    while len(selected) < k:
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(max_similarity, similarity[best], out=max_similarity)
+    
+    return selected
+
+
+@dataclass
+class RetrievalContext:
+    """Retrieval state for one chat turn, built once and shared by every stage"""
+    query: str
+    query_embedding: Optional[np.ndarray]
+    papers: List[Dict]
+    timings: Dict[str, float] = field(default_factory=dict)
+    _contexts: Dict[int, Dict] = field(default_factory=dict, repr=False)
+    
+    def build_context(self, max_context_length: int = 2000) -> Dict:
+        """Prompt context for these papers, memoized per length budget"""
+        if max_context_length not in self._contexts:
+            start = time.perf_counter()
+            self._contexts[max_context_length] = build_context_from_papers(self.papers, max_context_length)
+            self.timings['context'] = time.perf_counter() - start
+        return self._contexts[max_context_length]
+
 
 class RAGSystem:
     def __init__(self, config_path="config.yaml"):
@@ -13,32 +113,53 @@ class RAGSystem:
             self.config = yaml.safe_load(file)
         
         self.rag_config = self.config['rag']
-        self.embedding_model = SentenceTransformer(self.config['nlp']['embedding_model'])
+        self.embedding_model = get_embedding_service(self.config['nlp']['embedding_model'])
         
-        # Initialize ChromaDB for vector storage
+        # Repeated queries (quick questions, follow-ups) skip the encoder
+        self.query_cache = LRUCache(self.rag_config.get('query_cache_size', 512))
+        
+        # Cross-encoder scores per (query, paper id); the model loads on first rerank
+        self.rerank_cache = LRUCache(self.rag_config.get('rerank_cache_size', 4096))
+        
+        # Diversification of the final top-k (lambda per query type, 1.0 = off)
+        self.mmr_config = self.rag_config.get('mmr', {})
+        
+        # Initialize vector storage (backend selected by rag.vector_backend)
         self.setup_vector_db()
+        self._papers_signature = None
+        
+        # Display fields live outside the vector store, keyed by paper id
+        self.paper_store = PaperMetadataStore(self.rag_config.get('metadata_store_path', './paper_metadata.db'))
+        
+        # Related-papers graph (knn_graph.PaperGraph), attached after ingest
+        self.knn_graph = None
+        
+        # Optional chunk-level index; papers are ranked by their best passages
+        self.passage_config = self.rag_config.get('passage_index', {})
+        self.passage_index = None
+        if self.passage_config.get('enabled', False):
+            self.passage_index = PassageIndex(
+                path=self.passage_config.get('path', './passage_index'),
+                aggregation=self.passage_config.get('aggregation', 'max'),
+                passages_per_paper=self.passage_config.get('passages_per_paper', 2)
+            )
+        
+        # Optional separate title / abstract vectors with weighted fusion
+        self.multi_field_config = self.rag_config.get('multi_field', {})
+        self.multi_field_index = None
+        if self.multi_field_config.get('enabled', False):
+            self.multi_field_index = MultiFieldIndex(
+                path=self.multi_field_config.get('path', './multi_field_index'),
+                title_weight=self.multi_field_config.get('title_weight', 0.4),
+                abstract_weight=self.multi_field_config.get('abstract_weight', 0.6)
+            )
         
     def setup_vector_db(self):
-        """Setup ChromaDB for efficient vector storage and retrieval"""
+        """Setup the configured vector store (ChromaDB or in-process NumPy)"""
         try:
-            # Initialize ChromaDB client with updated configuration
-            self.chroma_client = chromadb.PersistentClient(path="./chroma_db")
-
-            # Create or get collection
-            collection_name = "arxiv_papers"
-            try:
-                self.collection = self.chroma_client.get_collection(name=collection_name)
-                print(f"Loaded existing ChromaDB collection: {collection_name}")
-            except:
-                self.collection = self.chroma_client.create_collection(
-                    name=collection_name,
-                    metadata={"description": "ArXiv CS papers for RAG"}
-                )
-                print(f"Created new ChromaDB collection: {collection_name}")
-
+            self.collection = create_vector_store(self.rag_config)
         except Exception as e:
-            print(f"Error setting up ChromaDB: {e}")
-            self.chroma_client = None
+            print(f"Error setting up vector store: {e}")
             self.collection = None
     
     def add_papers_to_vector_db(self, papers, embeddings):
@@ -47,28 +168,20 @@ class RAGSystem:
             return False
         
         try:
-            # Prepare data for ChromaDB
+            self.paper_store.upsert(papers)
+            
+            # Prepare data for the vector store
             ids = [paper['id'] for paper in papers]
-            documents = [f"{paper['title']} {paper['abstract']}" for paper in papers]
-            metadatas = [{
-                'title': paper['title'],
-                'authors': ', '.join(paper['authors']),
-                'categories': ', '.join(paper['categories']),
-                'published': paper['published'],
-                'primary_category': paper['primary_category']
-            } for paper in papers]
-            
-            # Convert embeddings to list format for ChromaDB
-            embeddings_list = embeddings.tolist()
+            metadatas = [self._paper_metadata(paper) for paper in papers]
             
             # Add to collection in batches
-            batch_size = 100
+            batch_size = self.collection.add_batch_size
             for i in range(0, len(papers), batch_size):
                 end_idx = min(i + batch_size, len(papers))
                 
                 self.collection.add(
-                    embeddings=embeddings_list[i:end_idx],
-                    documents=documents[i:end_idx],
+                    embeddings=embeddings[i:end_idx],
+                    documents=None,
                     metadatas=metadatas[i:end_idx],
                     ids=ids[i:end_idx]
                 )
@@ -81,95 +194,476 @@ class RAGSystem:
         except Exception as e:
             print(f"Error adding papers to vector DB: {e}")
             return False
+        finally:
+            self._papers_signature = None
+
+    def upsert_papers(self, papers: List[Dict], embeddings: np.ndarray) -> bool:
+        """Insert or overwrite papers (row i of embeddings is papers[i]) in both stores"""
+        if not self.collection:
+            return False
+
+        try:
+            self.paper_store.upsert(papers)
+
+            batch_size = self.collection.add_batch_size
+            for i in range(0, len(papers), batch_size):
+                batch = papers[i:i + batch_size]
+                self.collection.upsert(
+                    ids=[paper['id'] for paper in batch],
+                    embeddings=embeddings[i:i + batch_size],
+                    documents=None,
+                    metadatas=[self._paper_metadata(paper) for paper in batch]
+                )
+            return True
+
+        except Exception as e:
+            print(f"Error upserting papers to vector DB: {e}")
+            return False
+        finally:
+            self._papers_signature = None
+
+    def _paper_metadata(self, paper: Dict) -> Dict:
+        """Vector store metadata: only what filters and sync need"""
+        return {
+            'year': int(paper['published'][:4]),
+            'primary_category': paper['primary_category'],
+            'content_hash': paper_content_hash(paper, model_name=self.config['nlp']['embedding_model'])
+        }
     
-    def retrieve_relevant_papers(self, query: str, top_k: int = None) -> List[Dict]:
-        """Retrieve relevant papers using vector similarity search"""
+    def sync_papers(self, papers: List[Dict], embeddings: np.ndarray,
+                    fetch_rows: Optional[Callable[[List[int]], List[Dict]]] = None) -> Dict:
+        """
+        Bring the vector store in line with the given papers.
+        
+        Papers are diffed by id and content hash (which includes the
+        embedding model, so a model switch re-embeds all): only new or changed papers
+        are upserted, papers no longer present are deleted and unchanged
+        ones are skipped. Row i of embeddings must belong to papers[i].
+        The metadata store is kept in step with the vector store.
+        
+        papers may be projected to 'id' and a precomputed 'content_hash';
+        fetch_rows then returns the full paper dicts of the rows to upsert.
+        """
+        if not self.collection:
+            return {}
+        
+        try:
+            indexed_hashes = self.collection.get_content_hashes()
+            model_name = self.config['nlp']['embedding_model']
+            
+            seen = set()
+            new_rows = []
+            changed_rows = []
+            backfill_rows = []
+            for row, paper in enumerate(papers):
+                # Keep the first occurrence of duplicated ids
+                if paper['id'] in seen:
+                    continue
+                seen.add(paper['id'])
+                
+                indexed_hash = indexed_hashes.get(paper['id'])
+                if indexed_hash is None:
+                    new_rows.append(row)
+                elif indexed_hash != (paper.get('content_hash') or paper_content_hash(paper, model_name=model_name)):
+                    changed_rows.append(row)
+                elif paper['id'] not in self.paper_store:
+                    # Indexed before the metadata store existed
+                    backfill_rows.append(row)
+            
+            removed_ids = [paper_id for paper_id in indexed_hashes if paper_id not in seen]
+            if removed_ids:
+                self.collection.delete(removed_ids)
+            
+            upsert_rows = new_rows + changed_rows
+            
+            write_rows = upsert_rows + backfill_rows
+            full_papers = fetch_rows(write_rows) if fetch_rows else [papers[row] for row in write_rows]
+            full_papers = dict(zip(write_rows, full_papers))
+            
+            self.paper_store.upsert(list(full_papers.values()))
+            self.paper_store.delete([paper_id for paper_id in self.paper_store.ids if paper_id not in seen])
+            
+            batch_size = self.collection.add_batch_size
+            for i in range(0, len(upsert_rows), batch_size):
+                rows = upsert_rows[i:i + batch_size]
+                self.collection.upsert(
+                    ids=[papers[row]['id'] for row in rows],
+                    embeddings=embeddings[rows],
+                    documents=None,
+                    metadatas=[self._paper_metadata(full_papers[row]) for row in rows]
+                )
+            
+            stats = {
+                'added': len(new_rows),
+                'updated': len(changed_rows),
+                'deleted': len(removed_ids),
+                'unchanged': len(seen) - len(upsert_rows)
+            }
+            print(f"Vector store sync: {stats}")
+            return stats
+            
+        except Exception as e:
+            print(f"Error syncing papers to vector DB: {e}")
+            return {}
+        finally:
+            self._papers_signature = None
+    
+    @property
+    def papers_signature(self) -> str:
+        """Fingerprint of the indexed ids and content hashes; recomputed after the next write"""
+        if self._papers_signature is None:
+            hashes = self.collection.get_content_hashes() if self.collection else {}
+            digest = hashlib.sha1()
+            for paper_id in sorted(hashes):
+                digest.update(f"{paper_id}\0{hashes[paper_id]}\0".encode('utf-8'))
+            self._papers_signature = digest.hexdigest()
+        return self._papers_signature
+    
+    def retrieve_relevant_papers(self, query: str, top_k: int = None,
+                                 filters: Optional[Dict] = None,
+                                 fields=RESULT_FIELDS,
+                                 query_type: Optional[str] = None) -> List[Dict]:
+        """
+        Retrieve relevant papers using vector similarity search.
+        
+        filters, e.g. {'year_range': (2020, 2024), 'categories': ['cs.AI']},
+        are applied inside the index before top-k selection. Each paper dict
+        has 'id', 'similarity' and the requested metadata fields. query_type
+        selects the MMR diversity setting (rag.mmr.lambda).
+        """
+        return self.retrieve_relevant_papers_batch([query], top_k, filters, fields, query_type)[0]
+    
+    def retrieve_relevant_papers_batch(self, queries: List[str], top_k: int = None,
+                                       filters: Optional[Dict] = None,
+                                       fields=RESULT_FIELDS,
+                                       query_type: Optional[str] = None) -> List[List[Dict]]:
+        """
+        Retrieve relevant papers for several queries at once.
+        
+        All queries are encoded in a single encoder call and searched with a
+        single vector store query; one result list is returned per query.
+        """
+        if not queries:
+            return []
+
+        if not self.collection:
+            print("Error: vector store not available")
+            return [[] for _ in queries]
+
+        try:
+            # Generate query embeddings
+            query_embeddings = self.encode_queries(queries)
+            print(f"Generated query embeddings with shape: {query_embeddings.shape}")
+        except Exception as e:
+            print(f"Error encoding queries: {e}")
+            return [[] for _ in queries]
+
+        return self.search_by_embeddings(query_embeddings, top_k, queries=queries, filters=filters,
+                                         fields=fields, query_type=query_type)
+    
+    def search_by_embeddings(self, query_embeddings: np.ndarray, top_k: int = None,
+                             queries: Optional[List[str]] = None,
+                             filters: Optional[Dict] = None,
+                             fields=RESULT_FIELDS,
+                             query_type: Optional[str] = None) -> List[List[Dict]]:
+        """
+        Search the vector store with precomputed (n, dim) query embeddings.
+        
+        When reranking is enabled and the query texts are given, extra
+        candidates are fetched and reordered by the cross-encoder. When MMR
+        is on for the query type, the final top-k is picked for diversity
+        from an over-fetched candidate set.
+        """
         if top_k is None:
             top_k = self.rag_config['top_k_papers']
+        
+        rerank = queries is not None and self.rag_config.get('use_reranking', False)
+        mmr_lambda = self.mmr_lambda(query_type)
+        diversify = mmr_lambda < 1.0
+        
+        n_candidates = top_k
+        if rerank:
+            n_candidates = max(n_candidates, self.rag_config.get('rerank_candidates', top_k))
+        if diversify:
+            n_candidates = max(n_candidates, self.mmr_config.get('candidates', 20))
+        if rerank:
+            # The cross-encoder reads title and document
+            fields = tuple(fields) + tuple(field for field in ('title', 'document') if field not in fields)
+
+        empty = [[] for _ in range(len(query_embeddings))]
 
         if not self.collection:
-            print("Error: ChromaDB collection not available")
-            return []
+            print("Error: vector store not available")
+            return empty
 
         try:
-            # Check collection count
-            collection_count = self.collection.count()
-            print(f"Collection has {collection_count} documents")
+            # Check collection count (papers matching the filters, if any)
+            collection_count = self.collection.count(filters)
+            print(f"Collection has {collection_count} matching documents")
 
             if collection_count == 0:
-                print("Warning: Collection is empty")
-                return []
-
-            # Generate query embedding
-            query_embedding = self.embedding_model.encode([query])
-            print(f"Generated query embedding with shape: {query_embedding.shape}")
-
-            # Search in ChromaDB
-            results = self.collection.query(
-                query_embeddings=query_embedding.tolist(),
-                n_results=min(top_k, collection_count),  # Don't request more than available
-                include=['documents', 'metadatas', 'distances']
-            )
+                print("Warning: no documents match")
+                return empty
 
-            print(f"ChromaDB returned {len(results['ids'][0])} results")
-
-            # Process results
-            relevant_papers = []
-
-            # Find the range of distances to normalize properly
-            distances = [results['distances'][0][i] for i in range(len(results['ids'][0]))]
-            min_distance = min(distances)
-            max_distance = max(distances)
-            distance_range = max_distance - min_distance
-
-            print(f"Distance range: {min_distance:.4f} to {max_distance:.4f}, range: {distance_range:.4f}")
-
-            for i in range(len(results['ids'][0])):
-                distance = results['distances'][0][i]
-
-                # Normalize distance to similarity score (0-1 range)
-                # Lower distance = higher similarity
-                if distance_range > 0.001:  # Avoid division by very small numbers
-                    # Normalize to 0-1 where 0 = max_distance, 1 = min_distance
-                    similarity = 1.0 - ((distance - min_distance) / distance_range)
-                else:
-                    # All distances are very similar, assign based on rank
-                    similarity = 1.0 - (i * 0.05)  # Decreasing similarity by rank
-
-                # Ensure similarity is in valid range
-                similarity = max(0.0, min(1.0, similarity))
-
-                print(f"Paper {i}: distance={distance:.4f}, similarity={similarity:.4f}, threshold={self.config['data']['min_similarity']}")
-
-                paper_info = {
-                    'id': results['ids'][0][i],
-                    'document': results['documents'][0][i],
-                    'metadata': results['metadatas'][0][i],
-                    'similarity': similarity,
-                    'title': results['metadatas'][0][i]['title'],
-                    'authors': results['metadatas'][0][i]['authors'].split(', '),
-                    'categories': results['metadatas'][0][i]['categories'].split(', '),
-                    'published': results['metadatas'][0][i]['published'],
-                    'primary_category': results['metadatas'][0][i]['primary_category']
-                }
-
-                # Include all papers for now (remove similarity filtering)
-                relevant_papers.append(paper_info)
-                print(f"Added paper: {paper_info['title'][:50]}... (similarity: {similarity:.4f})")
-
-            print(f"Returning {len(relevant_papers)} papers")
-            return relevant_papers
+            # Passage and multi-field indexes carry no metadata, so filtered searches use the store
+            if self.passage_index is not None and len(self.passage_index) > 0 and not filters:
+                results, passages = self._query_passage_index(query_embeddings, n_candidates)
+            elif self.multi_field_index is not None and len(self.multi_field_index) > 0 and not filters:
+                results = self.multi_field_index.search(
+                    query_embeddings, n_candidates,
+                    prefilter=self.multi_field_config.get('title_prefilter', 0)
+                )
+                passages = None
+            else:
+                # Search in the vector store (ids and distances only, metadata is hydrated)
+                results = self.collection.query(
+                    query_embeddings=query_embeddings,
+                    n_results=min(n_candidates, collection_count),  # Don't request more than available
+                    include=['distances'],
+                    filters=filters
+                )
+                passages = None
+
+            result_lists = [self._format_results(results, row, fields) for row in range(len(query_embeddings))]
+            
+            if passages is not None:
+                for row, papers in enumerate(result_lists):
+                    for paper in papers:
+                        paper['passages'] = passages[row].get(paper['id'], [])
+            
+            if rerank:
+                result_lists = [
+                    self.rerank_papers(query, papers)
+                    for query, papers in zip(queries, result_lists)
+                ]
+            
+            if diversify:
+                result_lists = [
+                    self.diversify_papers(query_embedding, papers, top_k, mmr_lambda)
+                    for query_embedding, papers in zip(query_embeddings, result_lists)
+                ]
+            
+            result_lists = [papers[:top_k] for papers in result_lists]
+            
+            if rerank:
+                # The displayed (and filtered) relevance follows the cross-encoder order
+                for papers in result_lists:
+                    self._rerank_similarity(papers)
+            
+            return result_lists
 
         except Exception as e:
             print(f"Error retrieving papers: {e}")
             import traceback
             print(traceback.format_exc())
+            return empty
+    
+    def _query_passage_index(self, query_embeddings: np.ndarray, n_results: int):
+        """Rank papers through the passage index and return them in the vector store layout"""
+        results = {'ids': [], 'distances': []}
+        passages = []
+        
+        for query_embedding in query_embeddings:
+            hits = self.passage_index.search(query_embedding, n_results)
+            
+            # Papers dropped from the store since the passage index was built are skipped
+            hits = [hit for hit in hits if hit['id'] in self.paper_store]
+            
+            results['ids'].append([hit['id'] for hit in hits])
+            results['distances'].append([1.0 - hit['score'] for hit in hits])
+            passages.append({hit['id']: hit['passages'] for hit in hits})
+        
+        return results, passages
+    
+    def build_passage_index(self, papers: List[Dict]) -> bool:
+        """Chunk papers with chunk_text and build the passage index, unless it already covers them"""
+        if self.passage_index is None:
+            return False
+        if self.passage_index.matches(papers):
+            return True
+        
+        try:
+            chunk_size = self.passage_config.get('chunk_size', 128)
+            chunk_overlap = self.passage_config.get('chunk_overlap', 1)
+            self.passage_index.build(
+                papers,
+                encode=self.embedding_model.encode,
+                chunker=lambda text: self.chunk_text(text, chunk_size, chunk_overlap)
+            )
+            return True
+        except Exception as e:
+            print(f"Error building passage index: {e}")
+            return False
+    
+    def build_multi_field_index(self, papers: List[Dict]) -> bool:
+        """(Re)build the title/abstract index unless it already covers these papers"""
+        if self.multi_field_index is None:
+            return False
+        
+        # Duplicated ids keep their first occurrence, as in sync_papers
+        unique_papers = [papers[row] for row in unique_rows(papers)]
+        model_name = self.config['nlp']['embedding_model']
+        dimension = self.embedding_model.get_sentence_embedding_dimension()
+        if self.multi_field_index.matches(unique_papers, model_name, dimension):
+            return True
+        
+        try:
+            self.multi_field_index.build(unique_papers, encode=self.embedding_model.encode, model_name=model_name)
+            return True
+        except Exception as e:
+            print(f"Error building multi-field index: {e}")
+            return False
+    
+    def _format_results(self, results: Dict, row: int, fields=RESULT_FIELDS) -> List[Dict]:
+        """Hydrate one query's vector store hits into paper dicts with the requested fields"""
+        ids = results['ids'][row]
+        print(f"{self.collection.name} store returned {len(ids)} results")
+
+        relevant_papers = []
+        if not ids:
+            return relevant_papers
+
+        # Find the range of distances to normalize properly
+        distances = results['distances'][row]
+        min_distance = min(distances)
+        max_distance = max(distances)
+        distance_range = max_distance - min_distance
+
+        print(f"Distance range: {min_distance:.4f} to {max_distance:.4f}, range: {distance_range:.4f}")
+
+        papers = self.paper_store.hydrate(ids, fields)
+        for i in range(len(ids)):
+            # Hits without stored metadata (store out of sync) are skipped
+            if papers[i] is None:
+                continue
+            
+            distance = distances[i]
+
+            # Normalize distance to similarity score (0-1 range)
+            # Lower distance = higher similarity
+            if distance_range > 0.001:  # Avoid division by very small numbers
+                # Normalize to 0-1 where 0 = max_distance, 1 = min_distance
+                similarity = 1.0 - ((distance - min_distance) / distance_range)
+            else:
+                # All distances are very similar, assign based on rank
+                similarity = 1.0 - (i * 0.05)  # Decreasing similarity by rank
+
+            # Ensure similarity is in valid range
+            similarity = max(0.0, min(1.0, similarity))
+
+            paper_info = papers[i]
+            paper_info['similarity'] = similarity
+
+            # Include all papers for now (remove similarity filtering)
+            relevant_papers.append(paper_info)
+
+        print(f"Returning {len(relevant_papers)} papers")
+        return relevant_papers
+    
+    @staticmethod
+    def _rerank_similarity(papers: List[Dict]):
+        """Rescale 'similarity' from the cross-encoder scores of the returned papers (0-1 range)"""
+        # Reranking failed (papers keep the vector store order and score)
+        if not papers or not all('rerank_score' in paper for paper in papers):
+            return
+        
+        scores = [paper['rerank_score'] for paper in papers]
+        min_score = min(scores)
+        score_range = max(scores) - min_score
+        
+        for i, paper in enumerate(papers):
+            if score_range > 0.001:
+                similarity = (paper['rerank_score'] - min_score) / score_range
+            else:
+                similarity = 1.0 - (i * 0.05)
+            paper['similarity'] = max(0.0, min(1.0, similarity))
+    
+    def similar_papers(self, paper_id: str, k: int = 5, fields=RESULT_FIELDS) -> List[Dict]:
+        """Nearest papers to a known paper from the precomputed kNN graph"""
+        if self.knn_graph is None:
             return []
+        
+        neighbors = self.knn_graph.similar(paper_id, k)
+        papers = self.paper_store.hydrate([neighbor_id for neighbor_id, _ in neighbors], fields)
+        
+        similar = []
+        for paper, (_, score) in zip(papers, neighbors):
+            if paper is not None:
+                paper['similarity'] = max(0.0, score)
+                similar.append(paper)
+        return similar
+    
+    def mmr_lambda(self, query_type: Optional[str] = None) -> float:
+        """MMR relevance weight for a query type (1.0 when MMR is disabled)"""
+        if not self.mmr_config.get('enabled', False):
+            return 1.0
+        lambdas = self.mmr_config.get('lambda', {})
+        return float(lambdas.get(query_type, lambdas.get('default', 1.0)))
+    
+    def diversify_papers(self, query_embedding: np.ndarray, papers: List[Dict], top_k: int,
+                         lambda_mult: float) -> List[Dict]:
+        """Reorder papers by MMR using their stored vectors (no re-encoding)"""
+        if len(papers) <= 1:
+            return papers
+        
+        try:
+            vectors = self.collection.get_embeddings([paper['id'] for paper in papers])
+            
+            # Relevance on a 0-1 scale: cross-encoder order if reranked, else cosine
+            if all('rerank_score' in paper for paper in papers):
+                relevance = np.asarray([paper['rerank_score'] for paper in papers], dtype=np.float32)
+                spread = relevance.max() - relevance.min()
+                relevance = (relevance - relevance.min()) / spread if spread > 0 else np.ones_like(relevance)
+            else:
+                query_vector = np.asarray(query_embedding, dtype=np.float32).ravel()
+                query_vector = query_vector / (np.linalg.norm(query_vector) or 1.0)
+                norms = np.linalg.norm(vectors, axis=1)
+                norms[norms == 0] = 1.0
+                relevance = (vectors @ query_vector) / norms
+            
+            order = maximal_marginal_relevance(relevance, vectors, top_k, lambda_mult)
+            return [papers[i] for i in order]
+            
+        except Exception as e:
+            print(f"Error in MMR diversification: {e}")
+            return papers
+    
+    def encode_query(self, query: str) -> np.ndarray:
+        """Encode a query as a (1, dim) array, reusing cached vectors"""
+        return self.encode_queries([query])
     
-    def chunk_text(self, text: str) -> List[str]:
+    def encode_queries(self, queries: List[str]) -> np.ndarray:
+        """
+        Encode queries as an (n, dim) array; cache misses share one encoder call
+        
+        The normalized query is only the cache key: the encoder sees the
+        original text (of the first query with that key). The result is a
+        fresh array; cached vectors are read-only copies.
+        """
+        keys = [normalize_query(query) for query in queries]
+        vectors = [self.query_cache.get(key) for key in keys]
+        
+        missing = {}
+        for query, key, vector in zip(queries, keys, vectors):
+            if vector is None:
+                missing.setdefault(key, query)
+        if missing:
+            encoded = {}
+            for key, vector in zip(missing, self.embedding_model.encode(list(missing.values()))):
+                vector = np.array(vector, dtype=np.float32)
+                vector.flags.writeable = False
+                encoded[key] = vector
+                self.query_cache.put(key, vector)
+            vectors = [encoded[key] if vector is None else vector for key, vector in zip(keys, vectors)]
+        
+        return np.vstack(vectors)
+    
+    def chunk_text(self, text: str, chunk_size: int = None, chunk_overlap: int = None) -> List[str]:
         """Chunk text for better RAG performance"""
-        chunk_size = self.rag_config['chunk_size']
-        chunk_overlap = self.rag_config['chunk_overlap']
+        if chunk_size is None:
+            chunk_size = self.rag_config['chunk_size']
+        if chunk_overlap is None:
+            chunk_overlap = self.rag_config['chunk_overlap']
         
         # Simple sentence-based chunking
         sentences = text.split('.')
@@ -189,8 +683,9 @@ class RAGSystem:
                 chunk_text = '. '.join(current_chunk) + '.'
                 chunks.append(chunk_text)
                 
-                # Start new chunk with overlap
-                overlap_sentences = current_chunk[-chunk_overlap:] if len(current_chunk) > chunk_overlap else current_chunk
+                # Start new chunk with overlap (always drop at least one sentence so chunks advance)
+                overlap = min(chunk_overlap, len(current_chunk) - 1)
+                overlap_sentences = current_chunk[-overlap:] if overlap > 0 else []
                 current_chunk = overlap_sentences + [sentence]
                 current_length = sum(len(s.split()) for s in current_chunk)
             else:
@@ -207,56 +702,77 @@ class RAGSystem:
     def create_context_for_query(self, query: str, max_context_length: int = 2000) -> Dict:
         """Create context from relevant papers for query"""
         relevant_papers = self.retrieve_relevant_papers(query)
+        return build_context_from_papers(relevant_papers, max_context_length)
+    
+    def create_retrieval_context(self, query: str, top_k: int = None,
+                                 papers: Optional[List[Dict]] = None,
+                                 fields=RESULT_FIELDS,
+                                 query_type: Optional[str] = None) -> RetrievalContext:
+        """
+        Encode and search once for a chat turn.
         
-        context_parts = []
-        total_length = 0
-        used_papers = []
+        If papers are supplied (e.g. chosen by the caller) no search is run;
+        if the query cannot be encoded the context has no papers.
+        """
+        if papers is not None:
+            return RetrievalContext(query=query, query_embedding=None, papers=papers)
         
-        for paper in relevant_papers:
-            # Create paper summary for context
-            paper_context = f"Title: {paper['title']}\n"
-            paper_context += f"Abstract: {paper['document'].split('Abstract:')[1] if 'Abstract:' in paper['document'] else paper['document']}\n"
-            paper_context += f"Categories: {', '.join(paper['categories'])}\n\n"
-            
-            # Check if adding this paper would exceed context length
-            if total_length + len(paper_context.split()) > max_context_length:
-                break
-                
-            context_parts.append(paper_context)
-            used_papers.append(paper)
-            total_length += len(paper_context.split())
-        
-        context = {
-            'text': '\n'.join(context_parts),
-            'papers': used_papers,
-            'total_papers': len(used_papers)
-        }
+        start = time.perf_counter()
+        try:
+            query_embedding = self.encode_query(query)
+        except Exception as e:
+            print(f"Error encoding query: {e}")
+            return RetrievalContext(query=query, query_embedding=None, papers=[])
+        encoded = time.perf_counter()
+        papers = self.search_by_embeddings(query_embedding, top_k, queries=[query], fields=fields,
+                                           query_type=query_type)[0]
+        searched = time.perf_counter()
         
-        return context
+        return RetrievalContext(
+            query=query,
+            query_embedding=query_embedding[0],
+            papers=papers,
+            timings={'encode': encoded - start, 'search': searched - encoded}
+        )
+    
+    async def acreate_retrieval_context(self, query: str, top_k: int = None,
+                                        papers: Optional[List[Dict]] = None,
+                                        fields=RESULT_FIELDS,
+                                        query_type: Optional[str] = None) -> RetrievalContext:
+        """create_retrieval_context run in the event loop's default executor"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, functools.partial(self.create_retrieval_context, query, top_k, papers, fields, query_type)
+        )
     
     def rerank_papers(self, query: str, papers: List[Dict]) -> List[Dict]:
         """Rerank papers using cross-encoder for better relevance"""
-        if not self.rag_config.get('use_reranking', False):
+        if not self.rag_config.get('use_reranking', False) or not papers:
             return papers
         
         try:
-            from sentence_transformers import CrossEncoder
+            key = normalize_query(query)
+            scores = [self.rerank_cache.get((key, paper['id'])) for paper in papers]
             
-            # Load cross-encoder for reranking
-            cross_encoder = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
-            
-            # Create query-document pairs
-            pairs = []
-            for paper in papers:
-                doc_text = f"{paper['title']} {paper['document']}"
-                pairs.append([query, doc_text])
-            
-            # Get reranking scores
-            scores = cross_encoder.predict(pairs)
+            # Only score pairs we have not seen before
+            missing = [i for i, score in enumerate(scores) if score is None]
+            if missing:
+                cross_encoder = get_cross_encoder(
+                    self.rag_config.get('rerank_model', 'cross-encoder/ms-marco-MiniLM-L-6-v2')
+                )
+                pairs = [[query, f"{papers[i]['title']} {papers[i]['document']}"] for i in missing]
+                new_scores = cross_encoder.predict(
+                    pairs,
+                    batch_size=self.rag_config.get('rerank_batch_size', 32),
+                    show_progress_bar=False
+                )
+                
+                for i, score in zip(missing, new_scores):
+                    scores[i] = float(score)
+                    self.rerank_cache.put((key, papers[i]['id']), scores[i])
             
-            # Update similarity scores and resort
-            for i, paper in enumerate(papers):
-                paper['rerank_score'] = scores[i]
+            for paper, score in zip(papers, scores):
+                paper['rerank_score'] = score
             
             # Sort by rerank score
             papers.sort(key=lambda x: x['rerank_score'], reverse=True)
@@ -278,7 +794,12 @@ class RAGSystem:
             return {
                 'total_papers': count,
                 'embedding_dimension': self.embedding_model.get_sentence_embedding_dimension(),
-                'model_name': self.config['nlp']['embedding_model']
+                'model_name': self.config['nlp']['embedding_model'],
+                'encoder_memory_mb': self.embedding_model.get_stats()['memory_mb'],
+                'query_cache': self.query_cache.get_stats(),
+                'rerank_cache': self.rerank_cache.get_stats(),
+                'indexed_passages': len(self.passage_index) if self.passage_index is not None else 0,
+                'metadata_store_papers': len(self.paper_store)
             }
         except:
             return {}
@@ -0,0 +1,57 @@
+import os
+import time
+
+import numpy as np
+
+from caching import SemanticAnswerCache
+
+
+def unit(*values):
+    return np.array(values, dtype=np.float32)
+
+
+def test_lookup_is_scoped_by_query_type_and_namespace(tmp_path):
+    cache = SemanticAnswerCache(path=str(tmp_path / "answers.pkl"), threshold=0.9)
+    cache.put(unit(1, 0), "what is ml", "answer", query_type='fundamental', namespace='llama|papers-1')
+
+    assert cache.get(unit(1, 0.1), 'fundamental', 'llama|papers-1') == "answer"
+    assert cache.get(unit(0, 1), 'fundamental', 'llama|papers-1') is None
+    assert cache.get(unit(1, 0), 'advanced', 'llama|papers-1') is None
+    assert cache.get(unit(1, 0), 'fundamental', 'llama|papers-2') is None
+    assert cache.get(unit(1, 0), 'fundamental', 'mistral|papers-1') is None
+
+
+def test_inserts_append_to_the_log_and_reload(tmp_path):
+    path = str(tmp_path / "answers.pkl")
+    cache = SemanticAnswerCache(path=path)
+    cache.put(unit(1, 0), "first", "one", namespace='n')
+    size = os.path.getsize(path)
+    cache.put(unit(0, 1), "second", "two", namespace='n')
+    assert os.path.getsize(path) > size
+
+    with open(path, 'ab') as f:
+        f.write(b"\x80\x05torn")
+
+    reloaded = SemanticAnswerCache(path=path)
+    assert len(reloaded) == 2
+    assert reloaded.get(unit(0, 1), namespace='n') == "two"
+
+
+def test_eviction_and_expiry(tmp_path):
+    path = str(tmp_path / "answers.pkl")
+    cache = SemanticAnswerCache(path=path, max_size=2)
+    cache.put(unit(1, 0, 0), "a", "A")
+    cache.put(unit(0, 1, 0), "b", "B")
+    assert cache.get(unit(1, 0, 0)) == "A"
+    cache.put(unit(0, 0, 1), "c", "C")
+
+    assert cache.get(unit(0, 1, 0)) is None
+    assert cache.get(unit(1, 0, 0)) == "A"
+    assert cache.evictions == 1
+    # Evicted entries stay in the log until the next load compacts it
+    assert len(SemanticAnswerCache(path=path, max_size=2)) == 2
+
+    cache.ttl_seconds = 0
+    time.sleep(0.01)
+    assert cache.get(unit(0, 0, 1)) is None
+    assert len(SemanticAnswerCache(path=path, ttl_seconds=0)) == 0
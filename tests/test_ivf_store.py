@@ -0,0 +1,69 @@
+import numpy as np
+
+from vector_store import IVFVectorStore
+
+
+def build_store(path, n=500, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(n, dim)).astype(np.float32)
+    store = IVFVectorStore(path=str(path), nprobe=4)
+    store.add([f"p{i}" for i in range(n)], vectors, None,
+              [{'year': 2020, 'primary_category': 'cs.AI'} for _ in range(n)])
+    return store, vectors
+
+
+def test_ivf_matches_own_vector(tmp_path):
+    store, vectors = build_store(tmp_path)
+    store.build_ivf(nlist=16)
+    assert store.query(vectors[10], n_results=3)['ids'][0][0] == 'p10'
+
+
+def test_delete_discards_persisted_ivf(tmp_path):
+    store, vectors = build_store(tmp_path)
+    store.build_ivf(nlist=16)
+
+    store.delete(['p0', 'p1', 'p2'])
+    rng = np.random.default_rng(1)
+    store.upsert([f"new{i}" for i in range(5)], rng.normal(size=(5, vectors.shape[1])), None,
+                 [{'year': 2021, 'primary_category': 'cs.LG'} for _ in range(5)])
+
+    reopened = IVFVectorStore(path=str(tmp_path), nprobe=4)
+    assert reopened.ivf is None
+    assert reopened.query(vectors[10], n_results=3)['ids'][0][0] == 'p10'
+
+
+def test_ivf_with_other_ids_is_rejected(tmp_path):
+    store, vectors = build_store(tmp_path)
+    store.build_ivf(nlist=16)
+
+    assert IVFVectorStore(path=str(tmp_path), nprobe=4).ivf is not None
+
+    # Same row count, built over other ids
+    ivf_path = tmp_path / "ivf_index.npz"
+    data = dict(np.load(ivf_path))
+    data['signature'] = np.asarray('stale')
+    np.savez(ivf_path, **data)
+    assert IVFVectorStore(path=str(tmp_path), nprobe=4).ivf is None
+
+
+def test_rows_appended_after_build_keep_the_index(tmp_path):
+    store, vectors = build_store(tmp_path)
+    store.build_ivf(nlist=16)
+    store.upsert(['extra'], vectors[:1] * -1, None, [{'year': 2021, 'primary_category': 'cs.LG'}])
+
+    reopened = IVFVectorStore(path=str(tmp_path), nprobe=4)
+    assert reopened.ivf is not None
+    assert reopened.query(-vectors[0], n_results=1)['ids'][0] == ['extra']
+
+
+def test_updated_vector_is_found_again(tmp_path):
+    store, vectors = build_store(tmp_path)
+    store.build_ivf(nlist=16)
+
+    moved = -vectors[10]
+    store.upsert(['p10'], moved[np.newaxis, :], None, [{'year': 2020, 'primary_category': 'cs.AI'}])
+    assert store.query(moved, n_results=1)['ids'][0] == ['p10']
+
+    reopened = IVFVectorStore(path=str(tmp_path), nprobe=4)
+    assert reopened.ivf is None
+    assert reopened.query(moved, n_results=1)['ids'][0] == ['p10']
@@ -0,0 +1,60 @@
+from keyword_index import BM25Index, load_or_build_index, reciprocal_rank_fusion
+
+
+def paper(paper_id, title, abstract="plain text"):
+    return {'id': paper_id, 'title': title, 'abstract': abstract}
+
+
+def corpus():
+    papers = [paper(str(i), f"paper number {i}") for i in range(20)]
+    papers[3] = paper("3", "graph neural networks", "message passing on graphs")
+    papers[7] = paper("7", "neural machine translation", "sequence models")
+    return papers
+
+
+def test_duplicated_papers_are_indexed_once():
+    papers = corpus()
+    duplicated = papers + [papers[3]] * 9 + papers
+
+    index = BM25Index()
+    index.build(duplicated)
+    hits = index.search("graph neural", top_k=10)
+
+    assert len(index) == 20
+    assert [duplicated[row]['id'] for row, _ in hits] == ["3", "7"]
+
+
+def test_duplicates_do_not_change_scores():
+    papers = corpus()
+    single, duplicated = BM25Index(), BM25Index()
+    single.build(papers)
+    duplicated.build(papers + papers[:5] * 3)
+
+    assert single.search("neural graphs") == duplicated.search("neural graphs")
+
+
+def test_rows_index_the_given_list():
+    papers = [paper("a", "alpha"), paper("a", "alpha"), paper("b", "beta gamma")]
+    index = BM25Index()
+    index.build(papers)
+    assert index.search("gamma") == [(2, index.search("gamma")[0][1])]
+
+
+def test_edited_text_rebuilds_persisted_index(tmp_path):
+    path = str(tmp_path / "bm25.pkl")
+    papers = corpus()
+    load_or_build_index(papers, path)
+
+    papers[5] = paper("5", "diffusion models")
+    index = load_or_build_index(papers, path)
+    assert [row for row, _ in index.search("diffusion")] == [5]
+
+
+def test_rrf_counts_each_paper_once_per_list():
+    vector = [{'id': 'b'}, {'id': 'a'}]
+    keyword = [{'id': 'a'}, {'id': 'a'}, {'id': 'a'}, {'id': 'b'}]
+
+    fused = reciprocal_rank_fusion([vector, keyword])
+    scores = {result['id']: result['fusion_score'] for result in fused}
+    assert scores['a'] == 1 / 62 + 1 / 61
+    assert scores['b'] == 1 / 61 + 1 / 64
@@ -0,0 +1,46 @@
+import numpy as np
+
+from knn_graph import build_knn_graph, load_or_build_graph
+
+
+def make_manifest(paper_ids, text_hashes, model_name='model-a'):
+    return {'model_name': model_name, 'paper_ids': list(paper_ids), 'text_hashes': list(text_hashes)}
+
+
+def test_duplicated_ids_keep_their_first_row(tmp_path):
+    embeddings = np.array([[1, 0], [0, 1], [1, 0.1], [1, 0]], dtype=np.float32)
+    manifest = make_manifest(['a', 'b', 'c', 'a'], ['ha', 'hb', 'hc', 'ha'])
+    graph = load_or_build_graph(manifest, embeddings, str(tmp_path / "graph.npz"), k=2)
+
+    assert graph.ids == ['a', 'b', 'c']
+    assert [paper_id for paper_id, _ in graph.similar('a', 2)] == ['c', 'b']
+
+
+def test_graph_is_rebuilt_when_model_or_text_changes(tmp_path, capsys):
+    path = str(tmp_path / "graph.npz")
+    embeddings = np.eye(3, dtype=np.float32)
+    manifest = make_manifest(['a', 'b', 'c'], ['ha', 'hb', 'hc'])
+    load_or_build_graph(manifest, embeddings, path, k=2)
+
+    load_or_build_graph(manifest, embeddings, path, k=2)
+    assert "Loaded kNN graph" in capsys.readouterr().out
+
+    for changed in (make_manifest(['a', 'b', 'c'], ['ha', 'hb', 'hc'], model_name='model-b'),
+                    make_manifest(['a', 'b', 'c'], ['ha', 'hb', 'edited'])):
+        load_or_build_graph(changed, embeddings, path, k=2)
+        assert "stale" in capsys.readouterr().out
+        load_or_build_graph(manifest, embeddings, path, k=2)
+        capsys.readouterr()
+
+
+def test_empty_and_single_paper_corpus(tmp_path):
+    for n in (0, 1):
+        neighbors, scores = build_knn_graph(np.ones((n, 4), dtype=np.float32), k=5)
+        assert neighbors.shape == scores.shape == (n, 0)
+
+        path = str(tmp_path / f"graph{n}.npz")
+        manifest = make_manifest([f"p{i}" for i in range(n)], [f"h{i}" for i in range(n)])
+        graph = load_or_build_graph(manifest, np.ones((n, 4), dtype=np.float32), path, k=5)
+        assert len(graph) == n and graph.k == 0
+        assert graph.similar('p0') == []
+        assert len(load_or_build_graph(manifest, np.ones((n, 4), dtype=np.float32), path, k=5)) == n
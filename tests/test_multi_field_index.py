@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from multi_field_index import MultiFieldIndex
+
+VOCABULARY = ['graph', 'neural', 'retrieval', 'protein', 'robot', 'compiler']
+
+
+def encode(texts):
+    """Bag-of-words vectors over a tiny vocabulary"""
+    return np.array([[text.lower().count(word) + 0.01 for word in VOCABULARY] for text in texts], dtype=np.float32)
+
+
+PAPERS = [
+    {'id': 'a', 'title': "Graph retrieval", 'abstract': "Protein robot compiler"},
+    {'id': 'b', 'title': "Protein folding", 'abstract': "Graph neural retrieval"},
+    {'id': 'c', 'title': "Robot compiler", 'abstract': "Robot compiler protein"},
+]
+
+
+def test_fields_are_stored_in_separate_files(tmp_path):
+    index = MultiFieldIndex(path=str(tmp_path / "fields"))
+    index.build(PAPERS, encode=encode, model_name='model-a')
+
+    assert index.titles.shape == index.abstracts.shape == (3, len(VOCABULARY))
+    assert index.dim == len(VOCABULARY)
+
+
+def test_prefilter_fuses_the_best_titles(tmp_path):
+    index = MultiFieldIndex(path=str(tmp_path / "fields"), title_weight=0.5, abstract_weight=0.5)
+    index.build(PAPERS, encode=encode, model_name='model-a')
+    queries = encode(["graph retrieval", "robot compiler"])
+
+    full = index.search(queries, n_results=3)
+    prefiltered = index.search(queries, n_results=1, prefilter=1)
+    # Only the best title is a candidate, scored with the fused weights
+    assert prefiltered['ids'] == [['a'], ['c']]
+    for full_ids, full_distances, ids, distances in zip(full['ids'], full['distances'],
+                                                         prefiltered['ids'], prefiltered['distances']):
+        assert distances[0] == pytest.approx(full_distances[full_ids.index(ids[0])], abs=1e-6)
+
+
+def test_signature_covers_model_and_dimension(tmp_path):
+    MultiFieldIndex(path=str(tmp_path / "fields")).build(PAPERS, encode=encode, model_name='model-a')
+
+    index = MultiFieldIndex(path=str(tmp_path / "fields"))
+    assert index.matches(PAPERS, 'model-a', len(VOCABULARY))
+    assert not index.matches(PAPERS, 'model-b', len(VOCABULARY))
+    assert not index.matches(PAPERS, 'model-a', 2 * len(VOCABULARY))
+    assert not index.matches(PAPERS[:2], 'model-a', len(VOCABULARY))
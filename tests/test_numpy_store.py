@@ -0,0 +1,82 @@
+import os
+
+import numpy as np
+import pytest
+
+from vector_store import NumpyVectorStore
+
+
+def metadata(i):
+    return {'year': 2018 + i % 4, 'primary_category': 'cs.AI' if i % 2 else 'cs.CV', 'content_hash': str(i)}
+
+
+def vectors(n, dim=8, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+
+
+@pytest.mark.parametrize("storage", ["float32", "float16", "int8"])
+def test_incremental_upserts_match_a_single_write(tmp_path, storage):
+    data = vectors(60)
+    ids = [f"p{i}" for i in range(60)]
+
+    incremental = NumpyVectorStore(path=str(tmp_path / "a"), storage=storage, rescore_candidates=60)
+    for start in range(0, 60, 20):
+        incremental.upsert(ids[start:start + 20], data[start:start + 20], None,
+                           [metadata(i) for i in range(start, start + 20)])
+    changed = vectors(5, seed=1)
+    incremental.upsert(ids[10:15], changed, None, [metadata(i) for i in range(10, 15)])
+
+    expected = data.copy()
+    expected[10:15] = changed
+    single = NumpyVectorStore(path=str(tmp_path / "b"), storage=storage, rescore_candidates=60)
+    single.upsert(ids, expected, None, [metadata(i) for i in range(60)])
+
+    reopened = NumpyVectorStore(path=str(tmp_path / "a"), storage=storage, rescore_candidates=60)
+    assert reopened.ids == ids
+    assert np.allclose(np.asarray(reopened.matrix), np.asarray(single.matrix))
+    # Exact rescoring: int8 rows appended later reuse the first batch's scale
+    queries = vectors(4, seed=2)
+    assert reopened.query(queries, 5)['ids'] == single.query(queries, 5)['ids']
+    assert reopened.count({'categories': ['cs.AI']}) == 30
+
+
+def test_upsert_appends_instead_of_rewriting(tmp_path):
+    store = NumpyVectorStore(path=str(tmp_path))
+    store.upsert(['a', 'b'], vectors(2), None, [metadata(0), metadata(1)])
+    inode = os.stat(store.matrix_path).st_ino
+
+    store.upsert(['c', 'a'], vectors(2, seed=3), None, [metadata(2), metadata(3)])
+    assert os.stat(store.matrix_path).st_ino == inode
+    assert os.path.exists(store.log_path)
+    assert store.ids == ['a', 'b', 'c']
+    assert store.metadatas[0] == metadata(3)
+
+    # A delete rewrites the snapshot and drops the log
+    store.delete(['b'])
+    assert not os.path.exists(store.log_path)
+    assert NumpyVectorStore(path=str(tmp_path)).ids == ['a', 'c']
+
+
+def test_repeated_id_in_one_batch_is_stored_once(tmp_path):
+    store = NumpyVectorStore(path=str(tmp_path))
+    store.upsert(['a'], vectors(1), None, [metadata(0)])
+    store.upsert(['b', 'b'], vectors(2, seed=4), None, [metadata(1), metadata(2)])
+    assert store.ids == ['a', 'b']
+    assert store.metadatas[1] == metadata(2)
+
+
+def test_rows_without_records_are_ignored(tmp_path):
+    store = NumpyVectorStore(path=str(tmp_path))
+    store.upsert(['a', 'b'], vectors(2), None, [metadata(0), metadata(1)])
+    store.upsert(['c'], vectors(1, seed=5), None, [metadata(2)])
+
+    # Interrupted after the rows were appended, before their records
+    os.remove(store.log_path)
+    reopened = NumpyVectorStore(path=str(tmp_path))
+    assert reopened.ids == ['a', 'b']
+    assert reopened.matrix.shape == (2, 8)
+
+    reopened.upsert(['d'], vectors(1, seed=6), None, [metadata(3)])
+    again = NumpyVectorStore(path=str(tmp_path))
+    assert again.ids == ['a', 'b', 'd']
+    assert again.query(vectors(1, seed=6), 1)['ids'] == [['d']]
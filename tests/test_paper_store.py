@@ -0,0 +1,36 @@
+from paper_store import PaperMetadataStore
+
+
+def make_paper(paper_id, title):
+    return {'id': paper_id, 'title': title, 'abstract': f"Abstract of {title}",
+            'authors': ['A. Author'], 'categories': ['cs.LG'], 'published': '2023-01-01',
+            'primary_category': 'cs.LG', 'pdf_url': None}
+
+
+def test_upsert_matches_a_reload(tmp_path):
+    store = PaperMetadataStore(str(tmp_path / "papers.db"))
+    store.upsert([make_paper('a', "First"), make_paper('b', "Second")])
+    store.upsert([make_paper('c', "Third"), make_paper('a', "First, revised")])
+
+    reloaded = PaperMetadataStore(str(tmp_path / "papers.db"))
+    assert store.ids == reloaded.ids == ['a', 'b', 'c']
+    assert store.hydrate(['a', 'b', 'c']) == reloaded.hydrate(['a', 'b', 'c'])
+    assert store.hydrate(['a'], fields=('title',)) == [{'id': 'a', 'title': "First, revised"}]
+
+
+def test_upsert_does_not_reload_the_table(tmp_path, monkeypatch):
+    store = PaperMetadataStore(str(tmp_path / "papers.db"))
+    monkeypatch.setattr(store, 'load', lambda: (_ for _ in ()).throw(AssertionError("full reload")))
+
+    store.upsert([make_paper('a', "First")])
+    store.upsert([make_paper('a', "First"), make_paper('b', "Second")])
+    assert store.ids == ['a', 'b']
+    assert store.hydrate(['missing']) == [None]
+
+
+def test_repeated_id_in_a_batch_keeps_the_last_version(tmp_path):
+    store = PaperMetadataStore(str(tmp_path / "papers.db"))
+    store.upsert([make_paper('a', "Old"), make_paper('a', "New")])
+
+    reloaded = PaperMetadataStore(str(tmp_path / "papers.db"))
+    assert store.hydrate(['a'], fields=('title',)) == reloaded.hydrate(['a'], fields=('title',)) == [{'id': 'a', 'title': "New"}]
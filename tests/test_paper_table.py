@@ -0,0 +1,40 @@
+import pytest
+
+pytest.importorskip('pyarrow')
+
+import paper_table
+
+
+def make_paper(paper_id):
+    return {'id': paper_id, 'title': f"Title {paper_id}", 'authors': ['A. Author'],
+            'abstract': f"Abstract {paper_id}", 'categories': ['cs.LG'], 'published': '2023-01-01',
+            'pdf_url': None, 'primary_category': 'cs.LG', 'updated': None}
+
+
+def test_projected_read_and_count(tmp_path):
+    path = str(tmp_path / "papers.parquet")
+    paper_table.write_papers([make_paper('a'), make_paper('b')], path, {'total_papers': 2})
+
+    assert paper_table.count_papers(path) == 2
+    assert paper_table.read_papers(path, columns=('id', 'title')).to_pylist() == [
+        {'id': 'a', 'title': "Title a"}, {'id': 'b', 'title': "Title b"}]
+    assert paper_table.read_metadata(path) == {'total_papers': 2}
+    assert [paper for batch in paper_table.iter_papers(path, batch_size=1, columns=('id',)) for paper in batch] == [
+        {'id': 'a'}, {'id': 'b'}]
+
+
+def test_read_only_frame_blocks_in_place_writes():
+    pd = pytest.importorskip('pandas')
+    df = pd.DataFrame({'year': [2020, 2021], 'title': ["A", "B"], 'authors': [['x'], ['y']],
+                       'primary_category': pd.Categorical(['cs.LG', 'cs.CL'])})
+    frozen = paper_table.read_only_frame(df)
+
+    pd.testing.assert_frame_equal(frozen, df, check_dtype=False)
+    for column, value in (('year', 1999), ('title', "C"), ('primary_category', 'cs.CL')):
+        with pytest.raises(ValueError):
+            frozen.loc[0, column] = value
+
+    # Filtered frames and explicit copies are ordinary, writeable frames
+    recent = frozen[frozen['year'] == 2021].copy()
+    recent.loc[1, 'year'] = 2022
+    assert frozen['year'].tolist() == [2020, 2021]
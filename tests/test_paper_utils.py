@@ -0,0 +1,18 @@
+from paper_utils import paper_content_hash, unique_rows
+
+
+def paper(paper_id, title="Attention"):
+    return {'id': paper_id, 'title': title, 'abstract': "a", 'authors': ["x"], 'categories': ["cs.CL"],
+            'published': "2020-01-01", 'primary_category': "cs.CL"}
+
+
+def test_content_hash_covers_fields_and_model():
+    base = paper_content_hash(paper("1"), model_name="model-a")
+    assert base == paper_content_hash(paper("1"), model_name="model-a")
+    assert base != paper_content_hash(paper("1", title="Other"), model_name="model-a")
+    assert base != paper_content_hash(paper("1"), model_name="model-b")
+
+
+def test_unique_rows_keeps_first_occurrence():
+    papers = [paper("a"), paper("b"), paper("a"), paper("c"), paper("b")]
+    assert unique_rows(papers) == [0, 1, 3]
@@ -0,0 +1,53 @@
+import numpy as np
+
+from passage_index import PassageIndex
+
+VOCABULARY = ['graph', 'neural', 'retrieval', 'protein', 'robot', 'compiler']
+
+
+def encode(texts):
+    """Bag-of-words vectors over a tiny vocabulary"""
+    return np.array([[text.lower().count(word) for word in VOCABULARY] for text in texts], dtype=np.float32)
+
+
+def chunker(text):
+    return [sentence.strip() for sentence in text.split('.') if sentence.strip()]
+
+
+def make_paper(paper_id, abstract):
+    return {'id': paper_id, 'title': f"Paper {paper_id}", 'abstract': abstract}
+
+
+def build(tmp_path, papers):
+    index = PassageIndex(path=str(tmp_path / "passages"))
+    index.build(papers, encode=encode, chunker=chunker)
+    return index
+
+
+def test_duplicated_papers_are_indexed_once(tmp_path):
+    papers = [make_paper('a', "Graph neural networks. Retrieval"),
+              make_paper('b', "Protein folding"),
+              make_paper('a', "Graph neural networks. Retrieval")]
+    index = build(tmp_path, papers)
+
+    assert index.paper_ids == ['a', 'b']
+    assert len(index) == 3
+    hits = index.search(encode(["graph"])[0], top_k=5)
+    assert [hit['id'] for hit in hits] == ['a', 'b']
+
+
+def test_matches_tracks_ids_and_text(tmp_path):
+    papers = [make_paper('a', "Graph neural networks"), make_paper('b', "Protein folding")]
+    index = build(tmp_path, papers)
+
+    reloaded = PassageIndex(path=str(tmp_path / "passages"))
+    assert reloaded.matches(papers)
+    assert reloaded.matches(papers + [papers[0]])
+    assert not reloaded.matches(papers[:1])
+    assert not reloaded.matches([papers[0], make_paper('b', "Robot compiler")])
+
+
+def test_search_with_no_results_requested(tmp_path):
+    index = build(tmp_path, [make_paper('a', "Graph neural networks")])
+    assert index.search(encode(["graph"])[0], top_k=0) == []
+    assert index.search(encode(["graph"])[0], top_k=-1) == []
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from vector_store import ChromaVectorStore
+
+
+class FakeCollection:
+    """Minimal stand-in for a chromadb collection (metadata reads only)"""
+
+    def __init__(self, metadatas):
+        self.metadatas = metadatas
+        self.gets = 0
+
+    def count(self):
+        return len(self.metadatas)
+
+    def get(self, include=None, **kwargs):
+        self.gets += 1
+        return {'ids': [str(i) for i in range(len(self.metadatas))], 'metadatas': self.metadatas}
+
+
+def chroma_store(metadatas):
+    store = ChromaVectorStore.__new__(ChromaVectorStore)
+    store.collection = FakeCollection(metadatas)
+    store._facet_counts = None
+    return store
+
+
+def test_where_clause_single_category_is_an_equality():
+    assert ChromaVectorStore._where_clause({'categories': ['cs.AI']}) == {'primary_category': 'cs.AI'}
+
+
+def test_where_clause_several_categories_use_or():
+    where = ChromaVectorStore._where_clause({'categories': ['cs.AI', 'cs.LG'], 'year_range': (2020, 2022)})
+    assert where == {'$and': [
+        {'year': {'$gte': 2020}},
+        {'year': {'$lte': 2022}},
+        {'$or': [{'primary_category': 'cs.AI'}, {'primary_category': 'cs.LG'}]}
+    ]}
+    assert '$in' not in repr(where)
+
+
+def test_where_clause_without_filters():
+    assert ChromaVectorStore._where_clause(None) is None
+    assert ChromaVectorStore._where_clause({'categories': []}) is None
+
+
+def test_filtered_count_uses_cached_facets():
+    metadatas = [{'year': 2018 + i % 5, 'primary_category': ['cs.AI', 'cs.LG', 'cs.CV'][i % 3]} for i in range(30)]
+    store = chroma_store(metadatas)
+
+    filters = {'categories': ['cs.AI', 'cs.CV'], 'year_range': (2019, 2021)}
+    expected = sum(1 for m in metadatas
+                   if m['primary_category'] in ('cs.AI', 'cs.CV') and 2019 <= m['year'] <= 2021)
+    assert store.count(filters) == expected
+    assert store.count({'categories': ['cs.LG']}) == 10
+    assert store.count() == 30
+    assert store.collection.gets == 1
+
+
+def test_where_clause_accepted_by_chromadb(tmp_path):
+    chromadb = pytest.importorskip("chromadb")
+
+    client = chromadb.PersistentClient(path=str(tmp_path))
+    collection = client.create_collection("papers")
+    collection.add(
+        ids=['a', 'b', 'c'],
+        embeddings=np.eye(3).tolist(),
+        metadatas=[{'year': 2020, 'primary_category': 'cs.AI'},
+                   {'year': 2021, 'primary_category': 'cs.LG'},
+                   {'year': 2022, 'primary_category': 'cs.CV'}]
+    )
+    where = ChromaVectorStore._where_clause({'categories': ['cs.AI', 'cs.LG'], 'year_range': (2020, 2021)})
+    results = collection.query(query_embeddings=[[1.0, 0.0, 0.0]], n_results=2, where=where)
+    assert sorted(results['ids'][0]) == ['a', 'b']
@@ -0,0 +1,801 @@
+"""
+Vector store backends for the RAG system
+
+Every backend exposes the subset of the ChromaDB collection API that
+RAGSystem relies on (count / add / upsert / delete / query / get), so the retrieval code does
+not care which one is configured.
+
+Searches accept an optional backend-neutral ``filters`` dict that is
+applied before top-k selection:
+
+    {'year_range': (2020, 2024), 'categories': ['cs.AI', 'cs.LG']}
+
+``categories`` matches the paper's primary category.
+
+Stores only need the metadata used by filters and sync (year,
+primary_category, content_hash); documents are optional. Display fields
+are hydrated from paper_store.PaperMetadataStore.
+"""
+
+import io
+import json
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+def _append_npy_rows(path: str, rows: np.ndarray, n_rows: int) -> bool:
+    """
+    Append rows after the first n_rows rows of a 2-D .npy file, in place.
+
+    numpy pads .npy headers so the row count can grow without moving the
+    data; returns False if the new header does not fit (or the file does
+    not match), and the caller rewrites the file instead.
+    """
+    with open(path, 'r+b') as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+        if fortran_order or dtype != rows.dtype or shape[1:] != rows.shape[1:] or shape[0] < n_rows:
+            return False
+
+        header = io.BytesIO()
+        header_data = {
+            'descr': np.lib.format.dtype_to_descr(dtype),
+            'fortran_order': False,
+            'shape': (n_rows + len(rows),) + tuple(shape[1:])
+        }
+        if version == (1, 0):
+            np.lib.format.write_array_header_1_0(header, header_data)
+        else:
+            np.lib.format.write_array_header_2_0(header, header_data)
+        if len(header.getvalue()) != offset:
+            return False
+
+        # Rows first, header last: a crash leaves extra rows the records do not cover
+        f.seek(offset + n_rows * rows.shape[1] * dtype.itemsize)
+        f.write(np.ascontiguousarray(rows).tobytes())
+        f.truncate()
+        f.seek(0)
+        f.write(header.getvalue())
+    return True
+
+
+def _overwrite_npy_rows(path: str, rows: np.ndarray, values: np.ndarray):
+    """Write values into the given rows of a .npy file through a writable memmap"""
+    matrix = np.load(path, mmap_mode='r+')
+    matrix[rows] = values
+    matrix.flush()
+    del matrix
+
+
+class VectorStore:
+    """Interface shared by all vector store backends"""
+
+    name = "base"
+    add_batch_size = 100
+
+    def count(self, filters: Optional[Dict] = None) -> int:
+        raise NotImplementedError
+
+    def add(self, ids: List[str], embeddings, documents: Optional[List[str]], metadatas: List[Dict]):
+        raise NotImplementedError
+
+    def upsert(self, ids: List[str], embeddings, documents: Optional[List[str]], metadatas: List[Dict]):
+        """Insert new ids and overwrite existing ones"""
+        raise NotImplementedError
+
+    def delete(self, ids: List[str]):
+        raise NotImplementedError
+
+    def get_content_hashes(self) -> Dict[str, Optional[str]]:
+        """Map of every stored id to its metadata 'content_hash' (None if missing)"""
+        raise NotImplementedError
+
+    def query(self, query_embeddings, n_results: int = 10,
+              include=('documents', 'metadatas', 'distances'),
+              filters: Optional[Dict] = None) -> Dict:
+        """Return results in the ChromaDB layout: ids plus one list per query for each included field"""
+        raise NotImplementedError
+
+    def get(self, ids: List[str]) -> Dict:
+        """Fetch stored documents/metadatas by id, in the order requested"""
+        raise NotImplementedError
+
+    def get_embeddings(self, ids: List[str]) -> np.ndarray:
+        """Stored vectors as a (len(ids), dim) float32 array; unknown ids get zero rows"""
+        raise NotImplementedError
+
+
+class ChromaVectorStore(VectorStore):
+    """ChromaDB persistent collection"""
+
+    name = "chroma"
+
+    def __init__(self, path="./chroma_db", collection_name="arxiv_papers"):
+        import chromadb
+
+        self.client = chromadb.PersistentClient(path=path)
+
+        try:
+            self.collection = self.client.get_collection(name=collection_name)
+            print(f"Loaded existing ChromaDB collection: {collection_name}")
+        except Exception:
+            self.collection = self.client.create_collection(
+                name=collection_name,
+                metadata={"description": "ArXiv CS papers for RAG"}
+            )
+            print(f"Created new ChromaDB collection: {collection_name}")
+
+        # Rows per (year, primary_category), loaded on the first filtered count()
+        self._facet_counts = None
+
+    @staticmethod
+    def _where_clause(filters: Optional[Dict]) -> Optional[Dict]:
+        """Translate search filters into a ChromaDB metadata where clause"""
+        if not filters:
+            return None
+
+        clauses = []
+        year_range = filters.get('year_range')
+        if year_range:
+            clauses.append({'year': {'$gte': int(year_range[0])}})
+            clauses.append({'year': {'$lte': int(year_range[1])}})
+
+        # chromadb 0.4.0 has no $in; several categories become an $or of equalities
+        categories = list(filters.get('categories') or [])
+        if len(categories) == 1:
+            clauses.append({'primary_category': categories[0]})
+        elif categories:
+            clauses.append({'$or': [{'primary_category': category} for category in categories]})
+
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {'$and': clauses}
+
+    def _load_facet_counts(self) -> Dict:
+        stored = self.collection.get(include=['metadatas'])
+        counts = {}
+        for metadata in stored['metadatas']:
+            metadata = metadata or {}
+            key = (metadata.get('year'), metadata.get('primary_category'))
+            counts[key] = counts.get(key, 0) + 1
+        return counts
+
+    def count(self, filters=None) -> int:
+        """Matching rows, summed from cached per-(year, category) counts when filtered"""
+        if self._where_clause(filters) is None:
+            return self.collection.count()
+
+        if self._facet_counts is None:
+            self._facet_counts = self._load_facet_counts()
+
+        year_range = filters.get('year_range')
+        categories = set(filters.get('categories') or [])
+        total = 0
+        for (year, category), rows in self._facet_counts.items():
+            if year_range and (year is None or not int(year_range[0]) <= year <= int(year_range[1])):
+                continue
+            if categories and category not in categories:
+                continue
+            total += rows
+        return total
+
+    def add(self, ids, embeddings, documents, metadatas):
+        self._facet_counts = None
+        self.collection.add(
+            embeddings=np.asarray(embeddings).tolist(),
+            documents=documents,
+            metadatas=metadatas,
+            ids=ids
+        )
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self._facet_counts = None
+        self.collection.upsert(
+            embeddings=np.asarray(embeddings).tolist(),
+            documents=documents,
+            metadatas=metadatas,
+            ids=ids
+        )
+
+    def delete(self, ids):
+        self._facet_counts = None
+        for i in range(0, len(ids), self.add_batch_size):
+            self.collection.delete(ids=ids[i:i + self.add_batch_size])
+
+    def get_content_hashes(self):
+        stored = self.collection.get(include=['metadatas'])
+        return {
+            paper_id: (metadata or {}).get('content_hash')
+            for paper_id, metadata in zip(stored['ids'], stored['metadatas'])
+        }
+
+    def query(self, query_embeddings, n_results=10,
+              include=('documents', 'metadatas', 'distances'), filters=None):
+        return self.collection.query(
+            query_embeddings=np.asarray(query_embeddings).tolist(),
+            n_results=n_results,
+            where=self._where_clause(filters),
+            include=list(include)
+        )
+
+    def get(self, ids):
+        found = self.collection.get(ids=ids, include=['documents', 'metadatas'])
+        position = {paper_id: i for i, paper_id in enumerate(found['ids'])}
+        order = [position[paper_id] for paper_id in ids if paper_id in position]
+        return {
+            'ids': [found['ids'][i] for i in order],
+            'documents': [found['documents'][i] for i in order],
+            'metadatas': [found['metadatas'][i] for i in order]
+        }
+
+    def get_embeddings(self, ids):
+        found = self.collection.get(ids=ids, include=['embeddings'])
+        vectors = dict(zip(found['ids'], found['embeddings']))
+        if not vectors:
+            return np.zeros((len(ids), 0), dtype=np.float32)
+
+        dim = len(next(iter(vectors.values())))
+        matrix = np.zeros((len(ids), dim), dtype=np.float32)
+        for i, paper_id in enumerate(ids):
+            if paper_id in vectors:
+                matrix[i] = vectors[paper_id]
+        return matrix
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    In-process search over a memory-mapped embedding matrix.
+
+    Rows are L2-normalized when added, so scoring is a single
+    matrix-vector product; top-k uses argpartition instead of a full sort.
+    Distances are reported as cosine distance (1 - cosine similarity).
+
+    The exact float32 matrix is always kept on disk. With storage
+    "float16" or "int8" (scalar quantization with a per-dimension scale)
+    the scan runs over a 2-4x smaller copy, and the best
+    ``rescore_candidates`` rows can be re-scored exactly against float32.
+
+    Upserts are incremental: new rows are appended to the .npy files,
+    changed rows are overwritten in place, and their records are appended
+    to records.jsonl on top of the records.json snapshot. Deletes rewrite
+    everything (and re-derive the int8 scale, which appended rows reuse).
+    """
+
+    name = "numpy"
+    add_batch_size = 10000
+    # Rows widened to float32 at a time when scanning a quantized matrix
+    scan_block_size = 32768
+
+    def __init__(self, path="./numpy_index", storage="float32", rescore_candidates=0):
+        if storage not in ('float32', 'float16', 'int8'):
+            raise ValueError(f"Unknown vector storage: {storage}")
+
+        self.path = path
+        self.matrix_path = os.path.join(path, "embeddings.npy")
+        self.records_path = os.path.join(path, "records.json")
+        self.log_path = os.path.join(path, "records.jsonl")
+        self.quantized_path = os.path.join(path, f"embeddings.{storage}.npy")
+        self.scale_path = os.path.join(path, "int8_scale.npy")
+
+        self.storage = storage
+        self.rescore_candidates = rescore_candidates
+
+        self.ids = []
+        self.documents = []
+        self.metadatas = []
+        self.id_to_row = {}
+        self.matrix = None
+        self.search_matrix = None
+        self.scale = None
+
+        # Per-year / per-category row bitmaps, built on first filtered search
+        self._bitmaps = None
+
+        self._load()
+
+    def _load(self):
+        if not (os.path.exists(self.matrix_path) and os.path.exists(self.records_path)):
+            print(f"Created new NumPy vector index at {self.path}")
+            return
+
+        with open(self.records_path, 'r') as f:
+            records = json.load(f)
+
+        self.ids = records['ids']
+        self.documents = records['documents']
+        self.metadatas = records['metadatas']
+        self._replay_log()
+
+        # Rows appended without their records (interrupted upsert) are ignored
+        matrix = np.load(self.matrix_path, mmap_mode='r')
+        del self.ids[len(matrix):], self.documents[len(matrix):], self.metadatas[len(matrix):]
+        self.id_to_row = {paper_id: i for i, paper_id in enumerate(self.ids)}
+        self.matrix = matrix[:len(self.ids)]
+        self._load_search_matrix()
+        print(f"Loaded NumPy vector index with {len(self.ids)} vectors ({self.storage})")
+
+    def _replay_log(self):
+        """Apply records.jsonl (row overwrites and appends) to the loaded snapshot"""
+        if not os.path.exists(self.log_path):
+            return
+
+        with open(self.log_path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Torn last line from an interrupted write
+                    break
+                row = record['row']
+                if row < len(self.ids):
+                    self.ids[row] = record['id']
+                    self.documents[row] = record['document']
+                    self.metadatas[row] = record['metadata']
+                elif row == len(self.ids):
+                    self.ids.append(record['id'])
+                    self.documents.append(record['document'])
+                    self.metadatas.append(record['metadata'])
+
+    def _load_search_matrix(self):
+        """Open the matrix used for scanning, (re)building a quantized copy if needed"""
+        if self.storage == 'float32':
+            self.search_matrix = self.matrix
+            return
+
+        if os.path.exists(self.quantized_path):
+            search_matrix = np.load(self.quantized_path, mmap_mode='r')
+            if len(search_matrix) >= len(self.matrix) and search_matrix.shape[1:] == self.matrix.shape[1:] and (
+                    self.storage != 'int8' or os.path.exists(self.scale_path)):
+                self.search_matrix = search_matrix[:len(self.matrix)]
+                self.scale = np.load(self.scale_path) if self.storage == 'int8' else None
+                return
+
+        self._build_search_matrix()
+
+    def _build_search_matrix(self):
+        """Quantize the float32 matrix block by block and persist the result"""
+        rows = len(self.matrix)
+        dtype = np.int8 if self.storage == 'int8' else np.float16
+
+        if self.storage == 'int8':
+            max_abs = np.zeros(self.matrix.shape[1], dtype=np.float32)
+            for start in range(0, rows, self.scan_block_size):
+                block = np.asarray(self.matrix[start:start + self.scan_block_size])
+                max_abs = np.maximum(max_abs, np.abs(block).max(axis=0))
+            self.scale = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+            np.save(self.scale_path, self.scale)
+
+        self.search_matrix = None
+        quantized = np.lib.format.open_memmap(
+            self.quantized_path, mode='w+', dtype=dtype, shape=self.matrix.shape
+        )
+        for start in range(0, rows, self.scan_block_size):
+            block = np.asarray(self.matrix[start:start + self.scan_block_size])
+            quantized[start:start + len(block)] = self._quantize(block)
+        quantized.flush()
+        del quantized
+
+        self.search_matrix = np.load(self.quantized_path, mmap_mode='r')
+
+    def _save(self, matrix: np.ndarray):
+        os.makedirs(self.path, exist_ok=True)
+
+        # Write to temporary files first so a crash never leaves a torn index
+        tmp_matrix = self.matrix_path + ".tmp.npy"
+        tmp_records = self.records_path + ".tmp"
+        np.save(tmp_matrix, matrix)
+        with open(tmp_records, 'w') as f:
+            json.dump({
+                'ids': self.ids,
+                'documents': self.documents,
+                'metadatas': self.metadatas
+            }, f)
+
+        self.matrix = None
+        self.search_matrix = None
+        self._bitmaps = None
+        self.id_to_row = {paper_id: i for i, paper_id in enumerate(self.ids)}
+
+        # The snapshot below includes everything the log recorded
+        if os.path.exists(self.log_path):
+            os.remove(self.log_path)
+        os.replace(tmp_matrix, self.matrix_path)
+        os.replace(tmp_records, self.records_path)
+        self.matrix = np.load(self.matrix_path, mmap_mode='r')
+
+        if self.storage != 'float32':
+            self._build_search_matrix()
+        else:
+            self.search_matrix = self.matrix
+
+    @staticmethod
+    def _normalize(vectors) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors[np.newaxis, :]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _build_bitmaps(self):
+        years = {}
+        categories = {}
+        for row, metadata in enumerate(self.metadatas):
+            year = metadata.get('year')
+            if year is None and metadata.get('published'):
+                year = int(metadata['published'][:4])
+            years.setdefault(year, []).append(row)
+            categories.setdefault(metadata.get('primary_category'), []).append(row)
+
+        def to_bitmaps(groups):
+            bitmaps = {}
+            for key, rows in groups.items():
+                bitmap = np.zeros(len(self.ids), dtype=bool)
+                bitmap[rows] = True
+                bitmaps[key] = bitmap
+            return bitmaps
+
+        self._bitmaps = {'year': to_bitmaps(years), 'category': to_bitmaps(categories)}
+
+    def _filter_mask(self, filters: Optional[Dict]) -> Optional[np.ndarray]:
+        """Combine precomputed bitmaps into one row mask (None means all rows)"""
+        if not filters or not (filters.get('year_range') or filters.get('categories')):
+            return None
+
+        if self._bitmaps is None:
+            self._build_bitmaps()
+
+        mask = np.ones(len(self.ids), dtype=bool)
+        empty = np.zeros(len(self.ids), dtype=bool)
+
+        year_range = filters.get('year_range')
+        if year_range:
+            year_mask = empty.copy()
+            for year, bitmap in self._bitmaps['year'].items():
+                if year is not None and year_range[0] <= year <= year_range[1]:
+                    year_mask |= bitmap
+            mask &= year_mask
+
+        categories = filters.get('categories')
+        if categories:
+            category_mask = empty.copy()
+            for category in categories:
+                category_mask |= self._bitmaps['category'].get(category, empty)
+            mask &= category_mask
+
+        return mask
+
+    def count(self, filters=None) -> int:
+        mask = self._filter_mask(filters)
+        return len(self.ids) if mask is None else int(mask.sum())
+
+    def add(self, ids, embeddings, documents, metadatas):
+        """Same as upsert: ids already stored are overwritten"""
+        self.upsert(ids, embeddings, documents, metadatas)
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        vectors = self._normalize(embeddings)
+        documents = documents or [None] * len(ids)
+
+        # Batch index per stored row to overwrite / per new id (last occurrence wins)
+        updated = {}
+        appended = {}
+        for i, paper_id in enumerate(ids):
+            row = self.id_to_row.get(paper_id)
+            if row is None:
+                appended[paper_id] = i
+            else:
+                updated[row] = i
+
+        n_stored = len(self.ids)
+        for row, i in updated.items():
+            self.documents[row] = documents[i]
+            self.metadatas[row] = metadatas[i]
+        for paper_id, i in appended.items():
+            self.ids.append(paper_id)
+            self.documents.append(documents[i])
+            self.metadatas.append(metadatas[i])
+
+        updated_rows = np.fromiter(updated.keys(), dtype=np.int64, count=len(updated))
+        updated_vectors = vectors[list(updated.values())]
+        appended_vectors = vectors[list(appended.values())]
+
+        if n_stored == 0 or not self._write_rows(n_stored, updated_rows, updated_vectors, appended_vectors):
+            if n_stored:
+                matrix = np.array(np.load(self.matrix_path, mmap_mode='r')[:n_stored])
+            else:
+                matrix = np.zeros((0, vectors.shape[1]), dtype=np.float32)
+            matrix[updated_rows] = updated_vectors
+            self._save(np.vstack([matrix, appended_vectors]))
+
+    def _write_rows(self, n_stored: int, updated_rows: np.ndarray, updated_vectors: np.ndarray,
+                    appended_vectors: np.ndarray) -> bool:
+        """Apply an upsert to the files in place; False if they need a full rewrite"""
+        if self.storage == 'int8' and self.scale is None:
+            return False
+
+        # Mapped views must be released before the files change size
+        self.matrix = None
+        self.search_matrix = None
+        self._bitmaps = None
+
+        files = [(self.matrix_path, lambda vectors: vectors)]
+        if self.storage != 'float32':
+            files.append((self.quantized_path, self._quantize))
+
+        for path, convert in files:
+            if len(appended_vectors) and not _append_npy_rows(path, convert(appended_vectors), n_stored):
+                return False
+            if len(updated_rows):
+                _overwrite_npy_rows(path, updated_rows, convert(updated_vectors))
+
+        with open(self.log_path, 'a') as f:
+            for row in list(updated_rows) + list(range(n_stored, len(self.ids))):
+                f.write(json.dumps({
+                    'row': int(row),
+                    'id': self.ids[row],
+                    'document': self.documents[row],
+                    'metadata': self.metadatas[row]
+                }) + "\n")
+
+        for row in range(n_stored, len(self.ids)):
+            self.id_to_row[self.ids[row]] = row
+        self.matrix = np.load(self.matrix_path, mmap_mode='r')[:len(self.ids)]
+        if self.storage == 'float32':
+            self.search_matrix = self.matrix
+        else:
+            self.search_matrix = np.load(self.quantized_path, mmap_mode='r')[:len(self.ids)]
+        return True
+
+    def _quantize(self, vectors: np.ndarray) -> np.ndarray:
+        """Rows in the search matrix dtype (int8 uses the current scale)"""
+        if self.storage == 'int8':
+            return np.clip(np.rint(vectors / self.scale), -127, 127).astype(np.int8)
+        return vectors.astype(np.float16)
+
+    def delete(self, ids):
+        removed = set(ids)
+        keep = [row for row, paper_id in enumerate(self.ids) if paper_id not in removed]
+        if len(keep) == len(self.ids):
+            return
+
+        matrix = np.asarray(self.matrix)[keep]
+        self.ids = [self.ids[row] for row in keep]
+        self.documents = [self.documents[row] for row in keep]
+        self.metadatas = [self.metadatas[row] for row in keep]
+        self._save(matrix)
+
+    def get_content_hashes(self):
+        return {
+            paper_id: metadata.get('content_hash')
+            for paper_id, metadata in zip(self.ids, self.metadatas)
+        }
+
+    def _top_k(self, scores: np.ndarray, k: int) -> np.ndarray:
+        """Indices of the k highest scores, best first"""
+        if k >= len(scores):
+            return np.argsort(-scores)
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        return candidates[np.argsort(-scores[candidates])]
+
+    def _score(self, queries: np.ndarray) -> np.ndarray:
+        """(n_queries, n_rows) similarity scores against the search matrix"""
+        if self.storage == 'float32':
+            return queries @ self.search_matrix.T
+
+        # Fold the int8 scale into the queries: q . (x_int8 * scale) == (q * scale) . x_int8
+        scaled = queries * self.scale if self.storage == 'int8' else queries
+        scores = np.empty((len(queries), len(self.ids)), dtype=np.float32)
+        for start in range(0, len(self.ids), self.scan_block_size):
+            block = np.asarray(self.search_matrix[start:start + self.scan_block_size], dtype=np.float32)
+            scores[:, start:start + len(block)] = scaled @ block.T
+        return scores
+
+    def _score_rows(self, query: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """Scores of one query against a subset of rows of the search matrix"""
+        block = np.asarray(self.search_matrix[rows], dtype=np.float32)
+        if self.storage == 'int8':
+            return block @ (query * self.scale)
+        return block @ query
+
+    def _select(self, query: np.ndarray, scores: np.ndarray, rows: Optional[np.ndarray],
+                n_results: int, n_valid: int):
+        """
+        Pick the best n_results of the scored rows (rows=None means every row),
+        re-scoring a wider candidate set exactly when the scan is quantized.
+        """
+        n_results = min(n_results, n_valid)
+        if n_results <= 0:
+            return np.zeros(0, dtype=int), np.zeros(0, dtype=np.float32)
+
+        if self.storage != 'float32' and self.rescore_candidates > 0:
+            n_candidates = min(max(n_results, self.rescore_candidates), n_valid)
+            candidates = self._top_k(scores, n_candidates)
+            candidates = np.sort(candidates if rows is None else rows[candidates])
+            exact = np.asarray(self.matrix[candidates]) @ query
+            order = np.argsort(-exact)[:n_results]
+            return candidates[order], exact[order]
+
+        top = self._top_k(scores, n_results)
+        top_scores = scores[top]
+        return (top if rows is None else rows[top]), top_scores
+
+    @staticmethod
+    def _empty_results(include) -> Dict:
+        return {'ids': [], **{key: [] for key in include}}
+
+    def _format(self, results: Dict, top: np.ndarray, top_scores: np.ndarray):
+        results['ids'].append([self.ids[i] for i in top])
+        if 'documents' in results:
+            results['documents'].append([self.documents[i] for i in top])
+        if 'metadatas' in results:
+            results['metadatas'].append([self.metadatas[i] for i in top])
+        if 'distances' in results:
+            results['distances'].append((1.0 - top_scores).tolist())
+
+    def query(self, query_embeddings, n_results=10,
+              include=('documents', 'metadatas', 'distances'), filters=None):
+        results = self._empty_results(include)
+        if self.matrix is None or not self.ids:
+            return results
+
+        queries = self._normalize(query_embeddings)
+        all_scores = self._score(queries)
+
+        # Filtered-out rows can never enter the top-k
+        mask = self._filter_mask(filters)
+        n_valid = len(self.ids)
+        if mask is not None:
+            all_scores[:, ~mask] = -np.inf
+            n_valid = int(mask.sum())
+
+        for query, scores in zip(queries, all_scores):
+            top, top_scores = self._select(query, scores, None, n_results, n_valid)
+            self._format(results, top, top_scores)
+
+        return results
+
+    def get(self, ids):
+        rows = [self.id_to_row[paper_id] for paper_id in ids if paper_id in self.id_to_row]
+        return {
+            'ids': [self.ids[i] for i in rows],
+            'documents': [self.documents[i] for i in rows],
+            'metadatas': [self.metadatas[i] for i in rows]
+        }
+
+    def get_embeddings(self, ids):
+        if self.matrix is None:
+            return np.zeros((len(ids), 0), dtype=np.float32)
+
+        rows = np.asarray([self.id_to_row.get(paper_id, -1) for paper_id in ids], dtype=np.int64)
+        matrix = np.zeros((len(ids), self.matrix.shape[1]), dtype=np.float32)
+        found = rows >= 0
+        matrix[found] = self.matrix[rows[found]]
+        return matrix
+
+
+class IVFVectorStore(NumpyVectorStore):
+    """
+    NumPy store that scans only the nprobe nearest IVF clusters.
+
+    The IVF index is built offline (python ann_index.py) and persisted in
+    the store directory. Rows added after the build are always scanned
+    exactly until the next rebuild; without an index, queries fall back
+    to the exact scan.
+    """
+
+    name = "ivf"
+
+    def __init__(self, path="./numpy_index", storage="float32", rescore_candidates=0, nprobe=8):
+        self.nprobe = nprobe
+        self.ivf = None
+        super().__init__(path=path, storage=storage, rescore_candidates=rescore_candidates)
+
+        self.ivf_path = os.path.join(path, "ivf_index.npz")
+        self.load_ivf()
+
+    def load_ivf(self):
+        from ann_index import IVFIndex, ids_signature
+
+        if not os.path.exists(self.ivf_path):
+            print("No IVF index found, using exact search (build with: python ann_index.py)")
+            return
+
+        # The inverted lists hold row numbers: the rows they cover must still be the same ids
+        ivf = IVFIndex.load(self.ivf_path)
+        if ivf.n_rows > len(self.ids) or ivf.signature != ids_signature(self.ids[:ivf.n_rows]):
+            print("IVF index is stale, using exact search until it is rebuilt")
+            return
+
+        self.ivf = ivf
+        print(f"Loaded IVF index: {ivf.nlist} lists over {ivf.n_rows} vectors, nprobe={self.nprobe}")
+
+    def _drop_ivf(self, reason: str):
+        if self.ivf is not None:
+            print(f"{reason}, using exact search until the IVF index is rebuilt")
+        self.ivf = None
+        if os.path.exists(self.ivf_path):
+            os.remove(self.ivf_path)
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        # Overwritten rows keep their old cluster assignment in the inverted lists
+        n_indexed = self.ivf.n_rows if self.ivf is not None else 0
+        overwrites = any(self.id_to_row.get(paper_id, n_indexed) < n_indexed for paper_id in ids)
+        super().upsert(ids, embeddings, documents, metadatas)
+        if overwrites:
+            self._drop_ivf("Papers updated")
+
+    def delete(self, ids):
+        rows_before = len(self.ids)
+        super().delete(ids)
+        if len(self.ids) != rows_before:
+            # Row numbers shifted; the inverted lists no longer point at the right rows
+            self._drop_ivf("Papers deleted")
+
+    def build_ivf(self, nlist: int = None, n_iter: int = 10):
+        from ann_index import IVFIndex, ids_signature
+
+        self.ivf = IVFIndex.build(self.matrix, nlist=nlist, n_iter=n_iter)
+        self.ivf.signature = ids_signature(self.ids)
+        self.ivf.save(self.ivf_path)
+
+    def query(self, query_embeddings, n_results=10,
+              include=('documents', 'metadatas', 'distances'), filters=None):
+        if self.ivf is None or self.matrix is None or not self.ids:
+            return super().query(query_embeddings, n_results, include, filters)
+
+        results = self._empty_results(include)
+        queries = self._normalize(query_embeddings)
+        mask = self._filter_mask(filters)
+        n_valid = len(self.ids) if mask is None else int(mask.sum())
+        unindexed = np.arange(self.ivf.n_rows, len(self.ids))
+
+        for query in queries:
+            rows = self.ivf.probe(query, self.nprobe)
+            if len(unindexed):
+                rows = np.concatenate([rows, unindexed])
+            if mask is not None:
+                rows = rows[mask[rows]]
+
+            # Sparse filters can leave the probed lists short of k hits
+            if len(rows) < min(n_results, n_valid):
+                fallback = super().query(query[np.newaxis, :], n_results, include, filters)
+                for key in results:
+                    results[key].extend(fallback[key])
+                continue
+
+            scores = self._score_rows(query, rows)
+            top, top_scores = self._select(query, scores, rows, n_results, len(rows))
+            self._format(results, top, top_scores)
+
+        return results
+
+
+def create_vector_store(rag_config: Dict) -> VectorStore:
+    """Create the vector store backend selected by rag.vector_backend"""
+    backend = rag_config.get('vector_backend', 'chroma')
+
+    if backend == 'chroma':
+        return ChromaVectorStore(path=rag_config.get('chroma_path', './chroma_db'))
+    if backend == 'numpy':
+        return NumpyVectorStore(
+            path=rag_config.get('numpy_index_path', './numpy_index'),
+            storage=rag_config.get('vector_storage', 'float32'),
+            rescore_candidates=rag_config.get('rescore_candidates', 0)
+        )
+
+    if backend == 'ivf':
+        return IVFVectorStore(
+            path=rag_config.get('numpy_index_path', './numpy_index'),
+            storage=rag_config.get('vector_storage', 'float32'),
+            rescore_candidates=rag_config.get('rescore_candidates', 0),
+            nprobe=rag_config.get('ann', {}).get('nprobe', 16)
+        )
+
+    raise ValueError(f"Unknown vector backend: {backend}")